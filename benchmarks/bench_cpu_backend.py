@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from stub_services import StubServices
+from model_registry import registry, BACKENDS
+from rag_model import RAGSystem
+from rag_evaluator import iter_file_lines, calculate_semantic_similarities
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def run_backend(backend, args, queries, search_url):
+    """
+    Answers queries with one backend; returns its answers and timings.
+    """
+    rag = RAGSystem(embedder_name=args.embedder, generator_name=args.generator, backend=backend,
+                    threads=args.threads, do_sample=False, max_new_tokens=args.max_new_tokens,
+                    context_tokens=args.context_tokens, pack_context=bool(args.context_tokens),
+                    search_endpoints=[search_url])
+    rag.initialize_models()
+    # Embed every chunk on every run, so retrieval time reflects the embedder
+    rag.retriever.embedding_cache_dir = None
+
+    # Warm up both models so one-time setup is not timed
+    rag.retrieve_prompts(queries[:1], args.top_k)
+    rag.generate_batch(['warm up'], max_new_tokens=2)
+
+    start = time.perf_counter()
+    prompts = rag.retrieve_prompts(queries, args.top_k)
+    retrieval = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answers = rag.generate_batch(prompts, batch_size=args.batch_size)
+    generation = time.perf_counter() - start
+    tokens = sum(len(ids) for ids in rag.tokenizer(answers, add_special_tokens=False)['input_ids'])
+
+    stats = registry.stats()
+    suffix = '' if backend == 'auto' else f"@{backend}"
+    resident = sum(stats[key]['resident_bytes'] or 0 for key in
+                   (f"causal_lm:{args.generator}{suffix}", f"embedder:{args.embedder}{suffix}") if key in stats)
+    return answers, {
+        'retrieval_seconds': retrieval,
+        'generation_seconds': generation,
+        'generated_tokens': tokens,
+        'tokens_per_second': tokens / generation,
+        'queries_per_second': len(queries) / (retrieval + generation),
+        'resident_mb': resident / 1024 ** 2
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput and answer drift of the CPU backends')
+    parser.add_argument('--questions', default=os.path.join(ROOT, 'data', 'testing_questions.txt'))
+    parser.add_argument('--chatgpt', default=os.path.join(ROOT, 'data', 'chatgpt_answers.txt'),
+                        help='Reference answers, one per question')
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N questions')
+    parser.add_argument('--embedder', default='sentence-transformers/all-MiniLM-L6-v2',
+                        help='Sentence embedding model name or path')
+    parser.add_argument('--generator', default='HuggingFaceTB/SmolLM2-135M-Instruct', help='Causal LM name or path')
+    parser.add_argument('--evaluator', default='all-MiniLM-L6-v2', help='Embedder used to score the answers')
+    parser.add_argument('--backends', default='cpu,cpu-int8', help='Comma-separated backends; the first is the baseline')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--context-tokens', type=int, default=None, help='Pack and trim prompts to at most N tokens')
+    parser.add_argument('--out', default=None, help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    backends = args.backends.split(',')
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error(f"unknown backend {backend!r}")
+
+    queries = list(iter_file_lines(args.questions))[:args.limit]
+    references = list(iter_file_lines(args.chatgpt))[:len(queries)]
+
+    # Step 1: Answer every question with each backend (greedy, so differences come from the backend)
+    answers, rows = {}, {}
+    with StubServices() as services:
+        for backend in backends:
+            answers[backend], rows[backend] = run_backend(backend, args, queries, services.search_url)
+
+    # Step 2: Score answers against the references, and against the baseline backend for drift
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    evaluator = registry.get_embedder(args.evaluator)
+    baseline = backends[0]
+    for backend in backends:
+        path = os.path.join(RESULTS_DIR, f"answers-{backend}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            # One line per answer, as rag_evaluator.py expects
+            f.writelines(f"{answer.strip() or '-'}\n" for answer in answers[backend])
+        rows[backend]['answers_file'] = path
+        rows[backend]['similarity_to_reference'] = float(np.mean(
+            calculate_semantic_similarities(evaluator, references, answers[backend])))
+        rows[backend]['similarity_to_baseline'] = float(np.mean(
+            calculate_semantic_similarities(evaluator, answers[baseline], answers[backend])))
+        rows[backend]['identical_to_baseline'] = sum(a == b for a, b in zip(answers[baseline], answers[backend]))
+
+    print(f"{len(queries)} questions, generator {args.generator}, embedder {args.embedder}")
+    print(f"{'backend':<10}{'retrieval s':>13}{'tokens/s':>10}{'queries/s':>11}{'MB':>8}"
+          f"{'vs reference':>14}{'vs ' + baseline:>12}{'identical':>11}")
+    for backend, row in rows.items():
+        print(f"{backend:<10}{row['retrieval_seconds']:>13.2f}{row['tokens_per_second']:>10.1f}"
+              f"{row['queries_per_second']:>11.3f}{row['resident_mb']:>8.1f}{row['similarity_to_reference']:>14.4f}"
+              f"{row['similarity_to_baseline']:>12.4f}{row['identical_to_baseline']:>7}/{len(queries)}")
+    print(f"\nAnswers are in {RESULTS_DIR}; e.g. python src/rag_evaluator.py --questions {args.questions} "
+          f"--chatgpt {args.chatgpt} --model {rows[backends[-1]]['answers_file']}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from wiki_scraper import WikiScraper
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'wiki')
+
+
+def time_parser(parse, pages, repeat):
+    """
+    Returns the best-of-repeat seconds needed to parse every page once.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in pages:
+            parse(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and benchmark WikiScraper HTML extraction against BeautifulSoup')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help='Directory of saved Wikipedia pages')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    scraper = WikiScraper()
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    if not pages:
+        print(f"Error: No fixtures found in {args.fixtures}")
+        sys.exit(1)
+
+    # Step 1: Output must match the BeautifulSoup implementation exactly
+    mismatches = 0
+    for path, html in zip(paths, pages):
+        if scraper.parse_html(html) != scraper.parse_html_soup(html):
+            mismatches += 1
+            print(f"Mismatch: {os.path.basename(path)}")
+    print(f"{len(pages) - mismatches}/{len(pages)} fixtures match the BeautifulSoup output")
+
+    # Step 2: Micro-benchmark both implementations
+    total_mb = sum(len(html) for html in pages) / 1024 ** 2
+    soup_seconds = time_parser(scraper.parse_html_soup, pages, args.repeat)
+    fast_seconds = time_parser(scraper.parse_html, pages, args.repeat)
+    print(f"BeautifulSoup: {soup_seconds * 1000 / len(pages):.2f} ms/page ({total_mb / soup_seconds:.1f} MB/s)")
+    print(f"Streaming:     {fast_seconds * 1000 / len(pages):.2f} ms/page ({total_mb / fast_seconds:.1f} MB/s)")
+    print(f"Speedup:       {soup_seconds / fast_seconds:.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
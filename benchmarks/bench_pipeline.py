@@ -0,0 +1,251 @@
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import torch
+from stub_services import StubServices
+from rag_model import RAGSystem
+from retriever import Retriever
+from batch_pipeline import PipelinedBatchRunner
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Instance methods timed as pipeline stages: (owner attribute, method, stage name)
+STAGES = [
+    ('retriever', 'retrieve_wikipedia_links', 'search'),
+    ('retriever', 'scrape_wikipedia_pages', 'scrape'),
+    ('retriever', 'split_text_into_chunks', 'chunk'),
+    ('retriever', 'embed_chunks', 'embed'),
+    ('retriever', 'build_faiss_index', 'index_build'),
+    ('retriever', 'search_chunk', 'search_chunk'),
+    ('retriever', 'build_prompt', 'prompt'),
+    ('rag', 'generate', 'generate'),
+    ('rag', 'generate_batch', 'generate_batch')
+]
+
+
+class StageTimer:
+    """
+    Records the duration of every call to the wrapped methods, grouped by stage.
+    """
+    def __init__(self):
+        self.durations = defaultdict(list)
+
+    def wrap(self, owner, method, stage):
+        original = getattr(owner, method)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.durations[stage].append(time.perf_counter() - start)
+
+        # Shadow the bound method on this instance only
+        setattr(owner, method, timed)
+
+    def reset(self):
+        self.durations = defaultdict(list)
+
+
+def summarize(durations):
+    """
+    Returns count, total and latency percentiles (milliseconds) for a list of seconds.
+    """
+    values = np.array(durations) * 1000
+    return {
+        'count': len(values),
+        'total_ms': float(values.sum()),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p90_ms': float(np.percentile(values, 90)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max())
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_single(rag, timer, queries, top_k):
+    """
+    Answers queries one at a time, as in single-query mode.
+    """
+    timer.reset()
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        rag.generate_response_with_retriever(query, top_k=top_k)
+        latencies.append(time.perf_counter() - query_start)
+    wall = time.perf_counter() - start
+    return {
+        'queries': len(queries),
+        'wall_seconds': wall,
+        'throughput_qps': len(queries) / wall,
+        'end_to_end': summarize(latencies),
+        'stages': {stage: summarize(values) for stage, values in timer.durations.items()}
+    }
+
+
+def run_batch(rag, timer, queries, top_k, batch_size, retrieval_workers):
+    """
+    Answers queries through the pipelined batch runner, as in file modes.
+    """
+    timer.reset()
+    runner = PipelinedBatchRunner(rag, top_k=top_k, batch_size=batch_size, retrieval_workers=retrieval_workers)
+    start = time.perf_counter()
+    for _ in runner.run(queries):
+        pass
+    wall = time.perf_counter() - start
+    return {
+        'queries': len(queries),
+        'wall_seconds': wall,
+        'throughput_qps': len(queries) / wall,
+        'pipeline': runner.stats(),
+        'stages': {stage: summarize(values) for stage, values in timer.durations.items()}
+    }
+
+
+def print_mode(name, result):
+    print(f"\n{name}: {result['queries']} queries in {result['wall_seconds']:.2f}s "
+          f"({result['throughput_qps']:.2f} queries/s)")
+    rows = list(result['stages'].items())
+    if 'end_to_end' in result:
+        rows.append(('end_to_end', result['end_to_end']))
+    print(f"  {'stage':<16}{'calls':>7}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'total ms':>12}")
+    for stage, stats in rows:
+        print(f"  {stage:<16}{stats['count']:>7}{stats['p50_ms']:>11.2f}{stats['p90_ms']:>11.2f}"
+              f"{stats['p99_ms']:>11.2f}{stats['total_ms']:>12.1f}")
+
+
+def print_comparison(baseline, results):
+    """
+    Prints p50 latency and throughput of this run relative to a saved result.
+    """
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline['timestamp']}):")
+    for mode, result in results['modes'].items():
+        old = baseline['modes'].get(mode)
+        if old is None:
+            continue
+        print(f"  {mode}: throughput {old['throughput_qps']:.2f} -> {result['throughput_qps']:.2f} queries/s "
+              f"({result['throughput_qps'] / old['throughput_qps']:.2f}x)")
+        for stage, stats in result['stages'].items():
+            if stage in old['stages']:
+                before, after = old['stages'][stage]['p50_ms'], stats['p50_ms']
+                print(f"    {stage:<16}p50 {before:>9.2f} -> {after:>9.2f} ms ({after / max(before, 1e-9):.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the RAG pipeline against local stubs')
+    parser.add_argument('--questions', default=os.path.join(ROOT, 'data', 'testing_questions.txt'))
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N questions')
+    parser.add_argument('--embedder', default='sentence-transformers/all-MiniLM-L6-v2',
+                        help='Sentence embedding model name or path')
+    parser.add_argument('--generator', default='HuggingFaceTB/SmolLM2-135M-Instruct',
+                        help='Causal LM name or path')
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--retrieval-workers', type=int, default=2)
+    parser.add_argument('--modes', default='single,batch', help='Comma-separated subset of single,batch')
+    parser.add_argument('--search-delay', type=float, default=0.0, help='Emulated search latency in ms')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='Emulated page download latency in ms')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='Result file (default: results/pipeline-<commit>-<time>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()][:args.limit]
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    if not queries or not set(modes) <= {'single', 'batch'}:
+        print("Error: Need at least one question and modes from single,batch")
+        sys.exit(1)
+
+    torch.manual_seed(args.seed)
+    with StubServices(search_delay=args.search_delay / 1000, page_delay=args.page_delay / 1000) as services:
+        # Step 1: Load the models and point retrieval at the stubs, without on-disk caches
+        load_start = time.perf_counter()
+        # Greedy decoding, so timings and answers are comparable between runs
+        rag = RAGSystem(embedder_name=args.embedder, generator_name=args.generator,
+                        max_new_tokens=args.max_new_tokens, do_sample=False)
+        rag.initialize_models()
+        load_seconds = time.perf_counter() - load_start
+
+        timer = StageTimer()
+        for owner, method, stage in STAGES:
+            if owner == 'rag':
+                timer.wrap(rag, method, stage)
+
+        def fresh_retriever():
+            # A new Retriever (and SearchClient) per mode, so no mode is served by another mode's search cache
+            rag.retriever = Retriever(embedder=rag.emb_model, embedder_name=args.embedder,
+                                      search_url=services.search_url)
+            for owner, method, stage in STAGES:
+                if owner == 'retriever':
+                    timer.wrap(rag.retriever, method, stage)
+
+        # Step 2: One warm-up query so lazy initialization is not measured
+        fresh_retriever()
+        rag.generate_response_with_retriever(queries[0], top_k=args.top_k)
+
+        # Step 3: Measure each mode over the question set
+        results = {
+            'benchmark': 'pipeline',
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': vars(args),
+            'environment': {
+                'python': platform.python_version(),
+                'torch': torch.__version__,
+                'cuda': torch.cuda.is_available(),
+                'cpus': os.cpu_count(),
+                'torch_threads': torch.get_num_threads()
+            },
+            'model_load_seconds': load_seconds,
+            'modes': {}
+        }
+        if 'single' in modes:
+            fresh_retriever()
+            results['modes']['single'] = run_single(rag, timer, queries, args.top_k)
+        if 'batch' in modes:
+            fresh_retriever()
+            results['modes']['batch'] = run_batch(rag, timer, queries, args.top_k, args.batch_size,
+                                                  args.retrieval_workers)
+
+    for mode, result in results['modes'].items():
+        print_mode(mode, result)
+
+    # Step 4: Save the results so later commits can be compared against them
+    out_path = args.out or os.path.join(
+        RESULTS_DIR, f"pipeline-{results['commit'] or 'nocommit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {out_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from stub_services import StubServices
+from model_registry import registry
+from retriever import Retriever
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recall and latency of the BM25 prefilter against exhaustive dense ranking')
+    parser.add_argument('--questions', default=os.path.join(ROOT, 'data', 'testing_questions.txt'))
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N questions')
+    parser.add_argument('--embedder', default='sentence-transformers/all-MiniLM-L6-v2',
+                        help='Sentence embedding model name or path')
+    parser.add_argument('--top-n', default='8,16,32,64', help='Comma-separated prefilter sizes')
+    parser.add_argument('--weights', default='0,0.3,0.5', help='Comma-separated lexical weights')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=5, help='Search results scraped per question')
+    parser.add_argument('--chunk-size', type=int, default=1024)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    parser.add_argument('--out', default=None, help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()][:args.limit]
+    sizes = [int(n) for n in args.top_n.split(',')]
+    weights = [float(w) for w in args.weights.split(',')]
+
+    embedder = registry.get_embedder(args.embedder)
+    with StubServices() as services:
+        retriever = Retriever(embedder=embedder, embedder_name=args.embedder, search_url=services.search_url)
+
+        # Step 1: Fetch and chunk each question's pages once
+        chunk_sets = []
+        for query in queries:
+            pages = retriever.scrape_wikipedia_pages(retriever.retrieve_wikipedia_links(query, args.pages))
+            chunks = [(title, chunk) for title, text in pages
+                      for chunk in retriever.split_text_into_chunks(text, args.chunk_size, args.chunk_overlap)]
+            chunk_sets.append(chunks)
+
+    def run(top_n, weight):
+        retriever.prefilter_top_n = top_n
+        retriever.lexical_weight = weight
+        latencies, embedded, hit_sets = [], [], []
+        for query, chunks in zip(queries, chunk_sets):
+            start = time.perf_counter()
+            hits = retriever.rank_chunks(query, chunks, top_k=args.top_k)
+            latencies.append(time.perf_counter() - start)
+            embedded.append(min(len(chunks), top_n) if top_n else len(chunks))
+            hit_sets.append({(title, chunk) for title, chunk, _ in hits})
+        return latencies, embedded, hit_sets
+
+    # Warm up the embedder so the first measured setting is not penalized
+    retriever.rank_chunks(queries[0], chunk_sets[0][:8], top_k=args.top_k)
+
+    # Step 2: Exhaustive dense ranking is the reference
+    base_latencies, base_embedded, reference = run(None, 0.0)
+    rows = [{'setting': 'exhaustive', 'top_n': None, 'lexical_weight': None,
+             'embedded_chunks': float(np.mean(base_embedded)), 'p50_ms': float(np.median(base_latencies) * 1000),
+             'recall_at_k': 1.0}]
+
+    # Step 3: Every prefilter setting, scored by overlap with the exhaustive top-k
+    for top_n in sizes:
+        for weight in weights:
+            latencies, embedded, hit_sets = run(top_n, weight)
+            recall = np.mean([len(hits & ref) / max(1, len(ref)) for hits, ref in zip(hit_sets, reference)])
+            rows.append({'setting': f"top_n={top_n} w={weight}", 'top_n': top_n, 'lexical_weight': weight,
+                         'embedded_chunks': float(np.mean(embedded)), 'p50_ms': float(np.median(latencies) * 1000),
+                         'recall_at_k': float(recall)})
+
+    print(f"{len(queries)} questions, {np.mean([len(c) for c in chunk_sets]):.1f} chunks each on average")
+    print(f"{'setting':<22}{'embedded':>10}{'p50 ms':>10}{'recall@' + str(args.top_k):>11}")
+    for row in rows:
+        print(f"{row['setting']:<22}{row['embedded_chunks']:>10.1f}{row['p50_ms']:>10.1f}{row['recall_at_k']:>11.2f}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
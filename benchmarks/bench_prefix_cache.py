@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from stub_services import StubServices
+from rag_model import RAGSystem
+from prefix_cache import PrefixCache
+from retriever import PROMPT_PREFIX
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prefill time saved by caching the instruction prefix, and greedy output equality')
+    parser.add_argument('--questions', default=os.path.join(ROOT, 'data', 'testing_questions.txt'))
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N questions')
+    parser.add_argument('--embedder', default='sentence-transformers/all-MiniLM-L6-v2',
+                        help='Sentence embedding model name or path')
+    parser.add_argument('--generator', default='HuggingFaceTB/SmolLM2-135M', help='Small causal LM name or path')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--context-tokens', type=int, default=None,
+                        help='Pack prompts to at most this many tokens (see context_packer.py)')
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes over all prompts per setting')
+    parser.add_argument('--max-new-tokens', type=int, default=32, help='Greedy tokens compared between both paths')
+    parser.add_argument('--out', default=None, help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()][:args.limit]
+
+    rag = RAGSystem(embedder_name=args.embedder, generator_name=args.generator, do_sample=False,
+                    max_new_tokens=args.max_new_tokens, context_tokens=args.context_tokens)
+
+    # Step 1: Real prompts for every question, retrieved from the local stubs
+    with StubServices() as services:
+        rag.search_endpoints = [services.search_url]
+        rag.initialize_models()
+        prompts = rag.retrieve_prompts(queries, args.top_k)
+
+    # The cache as RAGSystem builds it (on CPU, unpadded calls skip it), and one that is used for every call
+    caches = {'default': rag.prefix_cache,
+              'always': PrefixCache(rag.generator.model, rag.tokenizer, PROMPT_PREFIX, cache_unpadded=True)}
+    prompt_tokens = [len(ids) for ids in rag.tokenizer(prompts)['input_ids']]
+
+    def prefill(batch_size, cache):
+        # One new token per prompt is almost entirely prefill
+        rag.prefix_cache = cache
+        timings = []
+        for _ in range(args.repeat):
+            for start in range(0, len(prompts), batch_size):
+                begin = time.perf_counter()
+                rag.generate_batch(prompts[start:start + batch_size], batch_size=batch_size, max_new_tokens=1)
+                timings.append((time.perf_counter() - begin) * 1000)
+        return timings
+
+    # Warm up every path so the first measured setting is not penalized
+    for cache in (None, *caches.values()):
+        prefill(1, cache)
+
+    # Step 2: Prefill latency for single and batched generation, without the cache and with each setting
+    rows = []
+    for batch_size in sorted({1, args.batch_size}):
+        uncached = np.median(prefill(batch_size, None))
+        row = {'batch_size': batch_size, 'uncached_p50_ms': float(uncached)}
+        for name, cache in caches.items():
+            cached = np.median(prefill(batch_size, cache))
+            row[f"{name}_p50_ms"] = float(cached)
+            row[f"{name}_saved"] = float(1 - cached / uncached)
+        rows.append(row)
+
+    # Step 3: Greedy answers must not change
+    rag.prefix_cache = None
+    single_reference = [rag.generate(prompt) for prompt in prompts]
+    batch_reference = rag.generate_batch(prompts, batch_size=args.batch_size)
+    rag.prefix_cache = caches['always']
+    single_matches = sum(a == b for a, b in zip(single_reference, [rag.generate(prompt) for prompt in prompts]))
+    batch_matches = sum(a == b for a, b in zip(batch_reference, rag.generate_batch(prompts, batch_size=args.batch_size)))
+
+    print(f"{len(prompts)} prompts, {np.mean(prompt_tokens):.0f} tokens on average, "
+          f"{len(caches['always'].prefix_ids)} of them cached")
+    print(f"{'batch':>6}{'uncached ms':>14}{'default ms':>13}{'saved':>8}{'always ms':>12}{'saved':>8}")
+    for row in rows:
+        print(f"{row['batch_size']:>6}{row['uncached_p50_ms']:>14.1f}{row['default_p50_ms']:>13.1f}"
+              f"{row['default_saved']:>8.1%}{row['always_p50_ms']:>12.1f}{row['always_saved']:>8.1%}")
+    print(f"Greedy answers identical: {single_matches}/{len(prompts)} single, {batch_matches}/{len(prompts)} batched")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'prompt_tokens': float(np.mean(prompt_tokens)),
+                       'prefix_tokens': len(caches['always'].prefix_ids), 'results': rows,
+                       'identical_single': single_matches, 'identical_batch': batch_matches}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
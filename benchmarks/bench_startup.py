@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MAIN = os.path.join(ROOT, 'src', 'main.py')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+from stub_services import StubServices
+
+
+def wall_ms(command, repeat):
+    """
+    Median wall time of running command to completion.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def first_answer_ms(command, cwd):
+    """
+    Runs a single-question main.py and returns (ms until the answer starts printing, ms until exit).
+
+    Report lines start with "[", so the first character of any other line is the streamed answer.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    first = None
+    line_start = True
+    while True:
+        char = process.stdout.read(1)
+        if not char:
+            break
+        if first is None and line_start and char not in (b'[', b'\n'):
+            first = (time.perf_counter() - start) * 1000
+        line_start = char == b'\n'
+    process.wait()
+    total = (time.perf_counter() - start) * 1000
+    return first if first is not None else total, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CLI startup: import time, argument errors and time to first answer')
+    parser.add_argument('--embedder', default='sentence-transformers/all-MiniLM-L6-v2',
+                        help='Sentence embedding model name or path')
+    parser.add_argument('--generator', default='HuggingFaceTB/SmolLM2-135M-Instruct', help='Causal LM name or path')
+    parser.add_argument('--question', default='When is GTA VI coming out?')
+    parser.add_argument('--max-new-tokens', type=int, default=16)
+    parser.add_argument('--search-delay', type=float, default=0.3, help='Emulated search latency in seconds')
+    parser.add_argument('--page-delay', type=float, default=0.5, help='Emulated page download latency in seconds')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default=None, help='Result file (default: benchmarks/results/startup-<time>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    python = sys.executable
+    src = os.path.join(ROOT, 'src')
+    results = {
+        # Interpreter start-up is subtracted so only the project's own imports are counted
+        'import_main_ms': wall_ms([python, '-c', f"import sys; sys.path.insert(0, {src!r}); import main"], args.repeat)
+                          - wall_ms([python, '-c', 'pass'], args.repeat),
+        'usage_error_ms': wall_ms([python, MAIN], args.repeat),
+        'invalid_option_ms': wall_ms([python, MAIN, '--prefilter', 'many', args.question], args.repeat)
+    }
+
+    # The page and embedding caches would answer every run after the first, so each run starts in an empty directory
+    firsts, totals = [], []
+    workdir = os.path.join(RESULTS_DIR, 'startup-workdir')
+    with StubServices(search_delay=args.search_delay, page_delay=args.page_delay) as services:
+        command = [python, '-u', MAIN, '--search', services.search_url, '--embedder', args.embedder,
+                   '--generator', args.generator, '--max-new-tokens', str(args.max_new_tokens), args.question]
+        for _ in range(args.repeat):
+            shutil.rmtree(workdir, ignore_errors=True)
+            os.makedirs(workdir)
+            first, total = first_answer_ms(command, workdir)
+            firsts.append(first)
+            totals.append(total)
+    shutil.rmtree(workdir, ignore_errors=True)
+    results['first_answer_ms'] = float(np.median(firsts))
+    results['single_question_total_ms'] = float(np.median(totals))
+
+    print(f"{'measurement':<28}{'ms':>10}")
+    for name, value in results.items():
+        print(f"{name:<28}{value:>10.0f}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        print(f"\nCompared with {args.compare}:")
+        for name, value in results.items():
+            if name in baseline:
+                print(f"  {name}: {baseline[name]:.0f} -> {value:.0f} ms ({value / baseline[name]:.2f}x)")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"startup-{int(time.time())}.json")
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'config': vars(args), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, f,
+                  indent=2)
+    print(f"Saved {out}")
+
+
+if __name__ == '__main__':
+    main()
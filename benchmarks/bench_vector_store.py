@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import faiss
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from stub_services import StubServices
+from model_registry import registry
+from retriever import Retriever
+from vector_store import CompressedVectorStore
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def fixture_vectors(args):
+    """
+    Embeds the chunks of every fixture page found for the questions, and the questions themselves.
+    """
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()][:args.limit]
+    embedder = registry.get_embedder(args.embedder)
+    with StubServices() as services:
+        retriever = Retriever(embedder=embedder, embedder_name=args.embedder, search_url=services.search_url)
+        links = dict.fromkeys(link for query in queries for link in retriever.retrieve_wikipedia_links(query, 5))
+        pages = retriever.scrape_wikipedia_pages(list(links))
+    chunks = list(dict.fromkeys(chunk for _, text in pages
+                                for chunk in retriever.split_text_into_chunks(text, args.chunk_size, args.chunk_overlap)))
+    vectors = np.asarray(embedder.encode(chunks, batch_size=64, show_progress_bar=False), dtype='float32')
+    query_vectors = np.asarray(embedder.encode(queries, show_progress_bar=False), dtype='float32')
+    return vectors, query_vectors
+
+
+def synthetic_vectors(args):
+    """
+    Clustered unit vectors standing in for a large embedded corpus; queries are perturbed corpus rows.
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype='float32')
+    vectors = np.empty((args.synthetic, args.dim), dtype='float32')
+    for start in range(0, args.synthetic, 100_000):
+        end = min(start + 100_000, args.synthetic)
+        assign = rng.integers(0, args.clusters, end - start)
+        vectors[start:end] = centers[assign] + rng.standard_normal((end - start, args.dim), dtype='float32')
+    queries = vectors[rng.integers(0, args.synthetic, args.queries)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape, dtype='float32')
+    return vectors, queries
+
+
+def per_query_ms(index, queries, k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+
+def recall(ids, reference):
+    return float(np.mean([len(set(row[row >= 0]) & set(ref)) / len(ref) for row, ref in zip(ids, reference)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and recall@k of the compressed vector store against IndexFlatL2')
+    parser.add_argument('--questions', default=os.path.join(ROOT, 'data', 'testing_questions.txt'))
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N questions')
+    parser.add_argument('--embedder', default='sentence-transformers/all-MiniLM-L6-v2',
+                        help='Sentence embedding model name or path')
+    parser.add_argument('--chunk-size', type=int, default=1024)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help='Use N synthetic clustered vectors instead of embedded fixture pages')
+    parser.add_argument('--dim', type=int, default=768, help='Dimension of the synthetic vectors')
+    parser.add_argument('--clusters', type=int, default=1000, help='Clusters in the synthetic vectors')
+    parser.add_argument('--queries', type=int, default=200, help='Synthetic queries')
+    parser.add_argument('--codes', default='int8,pq', help='Comma-separated code types')
+    parser.add_argument('--rerank', default='1,2,4,10', help='Comma-separated shortlist factors (k * rerank)')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--out', default=None, help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    # Step 1: Unit vectors, as CorpusIndex stores them
+    vectors, queries = synthetic_vectors(args) if args.synthetic else fixture_vectors(args)
+    faiss.normalize_L2(vectors)
+    faiss.normalize_L2(queries)
+    rows, dim = vectors.shape
+    k = min(args.top_k, rows)
+
+    # Step 2: The exact flat index is the reference
+    flat = faiss.IndexFlatL2(dim)
+    flat.add(vectors)
+    _, reference = flat.search(queries, k)
+    results = [{'setting': 'IndexFlatL2', 'memory_mb': len(faiss.serialize_index(flat)) / 1024 ** 2, 'disk_mb': 0.0,
+                'p50_ms': per_query_ms(flat, queries, k), 'recall_at_k': 1.0}]
+
+    # Step 3: Every code type and shortlist size
+    workdir = os.path.join(RESULTS_DIR, 'vector-store-workdir')
+    for codes in args.codes.split(','):
+        shutil.rmtree(workdir, ignore_errors=True)
+        store = CompressedVectorStore(workdir, dim, codes)
+        start = time.perf_counter()
+        store.train(vectors[::max(1, rows // 65536)])
+        for offset in range(0, rows, 100_000):
+            store.add(vectors[offset:offset + 100_000])
+        store.close()
+        build = time.perf_counter() - start
+
+        for rerank in [int(r) for r in args.rerank.split(',')]:
+            store.rerank = rerank
+            _, ids = store.search(queries, k)
+            results.append({'setting': f"{codes} rerank={rerank}", 'codes': codes, 'rerank': rerank,
+                            'build_seconds': build, 'memory_mb': store.memory_bytes() / 1024 ** 2,
+                            'disk_mb': store.disk_bytes() / 1024 ** 2, 'p50_ms': per_query_ms(store, queries, k),
+                            'recall_at_k': recall(ids, reference)})
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{rows} vectors of dimension {dim}, {len(queries)} queries")
+    print(f"{'setting':<20}{'memory MB':>11}{'fp16 file MB':>14}{'p50 ms':>9}{'recall@' + str(k):>11}")
+    for row in results:
+        print(f"{row['setting']:<20}{row['memory_mb']:>11.2f}{row['disk_mb']:>14.2f}{row['p50_ms']:>9.3f}"
+              f"{row['recall_at_k']:>11.3f}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
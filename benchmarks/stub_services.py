@@ -0,0 +1,144 @@
+import glob
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from html_extract import extract_page
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'wiki')
+
+# Pages are served under this path prefix so the retriever's wikipedia.org link filter still applies
+WIKI_PREFIX = '/wikipedia.org/wiki/'
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {'the', 'and', 'for', 'what', 'when', 'which', 'who', 'will', 'new', 'game', 'about', 'site',
+             'wikipedia', 'org', 'how', 'are', 'was', 'with', 'coming', 'out', 'does', 'did', 'has', 'have'}
+
+
+def terms(text):
+    return [word for word in WORD.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+class StubServices:
+    """
+    Local stand-ins for the searx instance and Wikipedia, served from fixture pages.
+
+    `/search` answers searx-style JSON, ranking fixtures by TF-IDF overlap of the
+    query with each page's title and text. Fixture pages are served verbatim
+    under `/wikipedia.org/wiki/<slug>`. Optional delays emulate network latency.
+    """
+    def __init__(self, fixture_dir=FIXTURE_DIR, search_delay=0.0, page_delay=0.0, port=0):
+        self.search_delay = search_delay
+        self.page_delay = page_delay
+        self.pages = {}
+        self.documents = []
+
+        # Index every fixture once: slug -> raw HTML, plus term counts for ranking
+        for path in sorted(glob.glob(os.path.join(fixture_dir, '*.html'))):
+            slug = os.path.basename(path)[:-len('.html')]
+            with open(path, 'rb') as f:
+                html = f.read()
+            self.pages[unquote(slug)] = html
+            title, text = extract_page(html)
+            self.documents.append((unquote(slug), Counter(terms(title) * 5 + terms(text))))
+
+        document_frequency = Counter()
+        for _, counts in self.documents:
+            document_frequency.update(counts.keys())
+        self.idf = {term: math.log(1 + len(self.documents) / df) for term, df in document_frequency.items()}
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self):
+        return self.base_url + '/search'
+
+    def search(self, query, max_results=5):
+        """
+        Returns the best matching fixture slugs for query.
+        """
+        query_terms = set(terms(query))
+        scored = []
+        for slug, counts in self.documents:
+            score = sum((1 + math.log(counts[term])) * self.idf[term] for term in query_terms if counts[term])
+            if score > 0:
+                scored.append((score, slug))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [slug for _, slug in scored[:max_results]]
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/search':
+                    time.sleep(services.search_delay)
+                    params = parse_qs(url.query)
+                    query = params.get('q', [''])[0]
+                    max_results = int(params.get('max_results', ['5'])[0])
+                    results = [{'url': services.base_url + WIKI_PREFIX + quote(slug),
+                                'title': slug.replace('_', ' ')}
+                               for slug in services.search(query, max_results)]
+                    body = json.dumps({'query': query, 'results': results}).encode('utf-8')
+                    self.send_body(200, body, 'application/json')
+                elif url.path.startswith(WIKI_PREFIX) and unquote(url.path[len(WIKI_PREFIX):]) in services.pages:
+                    time.sleep(services.page_delay)
+                    self.send_body(200, services.pages[unquote(url.path[len(WIKI_PREFIX):])], 'text/html; charset=UTF-8')
+                else:
+                    self.send_body(404, b'Not found', 'text/plain')
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    # Serve the fixtures for manual runs
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    with StubServices(port=port) as services:
+        print(f"Search: {services.search_url}  Pages: {services.base_url}{WIKI_PREFIX}<slug>")
+        try:
+            services.thread.join()
+        except KeyboardInterrupt:
+            pass
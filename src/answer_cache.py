@@ -0,0 +1,241 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from search_client import normalize_query
+from tracing import tracer
+
+
+def chunk_set_hash(hits):
+    """
+    Order-independent SHA-256 of the (title, chunk) pairs an answer was generated from.
+    """
+    digests = sorted(hashlib.sha256(f"{title}\n{chunk}".encode('utf-8')).hexdigest() for title, chunk, _ in hits)
+    return hashlib.sha256('\n'.join(digests).encode('ascii')).hexdigest()
+
+
+class AnswerCache:
+    """
+    Persistent cache of generated answers for repeated and paraphrased questions.
+
+    Entries are keyed by the normalized query and the hash of the chunk set the
+    answer was generated from. `lookup` answers a repeated question, or a
+    paraphrase whose embedding has cosine similarity of at least `threshold`
+    with a past question, before any retrieval, so its pages are not re-checked
+    and staleness is bounded only by `ttl`. The chunk set hash is only consulted
+    by `get` after retrieval, for questions `lookup` did not answer. Entries
+    expire after `ttl` seconds, the least recently used are
+    evicted beyond `max_entries`, and every change is appended to a log that
+    is replayed (and compacted) on startup. Query vectors and answers depend on
+    the models, so each (embedder, generator, backend) setting gets its own
+    directory under `cache_dir`.
+    """
+    def __init__(self, embedder, embedder_name, generator_name, backend='auto', cache_dir='cache/answers',
+                 threshold=0.95, ttl=7 * 24 * 3600, max_entries=10000):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # LRU of key -> entry, the latest key per normalized query, and faiss id -> key
+        self._entries = OrderedDict()
+        self._latest = {}
+        self._ids = {}
+        self._next_id = 0
+        self.index = None
+
+        # Counters exposed through stats()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.chunk_hits = 0
+        self.misses = 0
+
+        # One directory per setting, so switching models never mixes embedding spaces or answers
+        safe = [re.sub(r'[^A-Za-z0-9_.-]', '_', name) for name in (embedder_name, generator_name, backend)]
+        self.path = os.path.join(cache_dir, '-'.join(safe))
+        os.makedirs(self.path, exist_ok=True)
+        self.log_path = os.path.join(self.path, 'answers.jsonl')
+        self._load()
+
+    @staticmethod
+    def key(normalized, chunks):
+        return hashlib.sha256(f"{normalized}\n{chunks}".encode('utf-8')).hexdigest()
+
+    def _embed(self, query):
+        embedding = np.asarray(self.embedder.encode([query], convert_to_tensor=False, show_progress_bar=False),
+                               dtype='float32')
+        faiss.normalize_L2(embedding)
+        return embedding
+
+    def _fresh(self, entry):
+        return time.time() - entry['created'] < self.ttl
+
+    def lookup(self, query):
+        """
+        Returns a stored answer for query or a close paraphrase of it, or None; needs no retrieval.
+        """
+        normalized = normalize_query(query)
+        with self._lock:
+            entry = self._get(self._latest.get(normalized))
+            if entry is not None:
+                self.exact_hits += 1
+                tracer.count('answer_cache_hits_total')
+                return entry['answer']
+            if self.index is None or not self.index.ntotal:
+                return None
+
+        # Encoding runs outside the lock so concurrent lookups share the embedder
+        embedding = self._embed(query)
+        with self._lock:
+            if self.index is None or not self.index.ntotal:
+                return None
+            similarities, ids = self.index.search(embedding, 1)
+            if similarities[0][0] < self.threshold:
+                return None
+            entry = self._get(self._ids.get(int(ids[0][0])))
+            if entry is None:
+                return None
+            self.semantic_hits += 1
+            tracer.count('answer_cache_hits_total')
+            return entry['answer']
+
+    def get(self, query, hits):
+        """
+        Returns the answer stored for query and exactly these retrieved chunks, or None.
+        """
+        with self._lock:
+            entry = self._get(self.key(normalize_query(query), chunk_set_hash(hits)))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.chunk_hits += 1
+            tracer.count('answer_cache_hits_total')
+            return entry['answer']
+
+    def _get(self, key):
+        """
+        Returns the fresh entry for key and marks it recently used; drops it if expired.
+        """
+        entry = self._entries.get(key) if key else None
+        if entry is None:
+            return None
+        if not self._fresh(entry):
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, query, hits, answer):
+        """
+        Stores answer for query and the chunk set it was generated from.
+        """
+        normalized = normalize_query(query)
+        entry = {
+            'key': self.key(normalized, chunk_set_hash(hits)),
+            'query': query,
+            'normalized': normalized,
+            'answer': answer,
+            'created': time.time()
+        }
+        embedding = self._embed(query)
+        record = {'put': dict(entry), 'vector': base64.b64encode(embedding[0].tobytes()).decode('ascii')}
+        with self._lock:
+            self._insert(entry, embedding[0])
+            self._append(record)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _insert(self, entry, vector):
+        if entry['key'] in self._entries:
+            self._drop(entry['key'], log=False)
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(vector)))
+
+        entry['id'] = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(vector.reshape(1, -1), np.array([entry['id']], dtype='int64'))
+        self._ids[entry['id']] = entry['key']
+        self._entries[entry['key']] = entry
+        self._latest[entry['normalized']] = entry['key']
+
+    def _drop(self, key, log=True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.index.remove_ids(np.array([entry['id']], dtype='int64'))
+        del self._ids[entry['id']]
+        if self._latest.get(entry['normalized']) == key:
+            del self._latest[entry['normalized']]
+        if log:
+            self._append({'drop': key})
+
+    def _append(self, record):
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _load(self):
+        """
+        Replays the log, then rewrites it with only the live entries if it has grown.
+        """
+        if not os.path.exists(self.log_path):
+            return
+        lines = 0
+        vectors = {}
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A partial last line from an interrupted write
+                    continue
+                if 'drop' in record:
+                    self._drop(record['drop'], log=False)
+                    vectors.pop(record['drop'], None)
+                    continue
+                entry = record['put']
+                vector = np.frombuffer(base64.b64decode(record['vector']), dtype='float32')
+                self._insert(entry, vector)
+                vectors[entry['key']] = record['vector']
+
+        # Expired and overflowing entries are not worth keeping
+        for key in [key for key, entry in self._entries.items() if not self._fresh(entry)]:
+            self._drop(key, log=False)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)), log=False)
+
+        if lines > len(self._entries):
+            tmp_path = f"{self.log_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key, entry in self._entries.items():
+                    record = {'put': {name: value for name, value in entry.items() if name != 'id'},
+                              'vector': vectors[key]}
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.log_path)
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits + self.chunk_hits
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'chunk_hits': self.chunk_hits,
+                'misses': self.misses,
+                'hit_ratio': hits / (hits + self.misses) if hits + self.misses else 0.0
+            }
+
+    def report(self):
+        stats = self.stats()
+        print(f"[Answer cache] {stats['entries']} entries: {stats['exact_hits']} repeated, "
+              f"{stats['semantic_hits']} paraphrased and {stats['chunk_hits']} same-context questions answered "
+              f"from cache, {stats['misses']} generated")
@@ -0,0 +1,139 @@
+from collections import deque
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " ", ""]
+
+
+def token_length_function(tokenizer):
+    """
+    Returns a length function that counts tokenizer tokens instead of characters.
+    """
+    def length(text):
+        return len(tokenizer.encode(text, add_special_tokens=False, verbose=False))
+    return length
+
+
+class TextChunker:
+    """
+    Dependency-free recursive splitter that returns (start, end) offsets into the text.
+
+    Follows the semantics of langchain's RecursiveCharacterTextSplitter with the
+    default keep_separator=True: use the first separator present in the text,
+    keep each separator at the start of the piece that follows it, merge pieces
+    up to chunk_size with chunk_overlap, recurse into pieces that are still too
+    large, and strip whitespace from merged chunks. Because kept separators make
+    every merged chunk a contiguous span, chunks are plain offsets and no
+    strings are copied.
+    """
+    def __init__(self, chunk_size=500, chunk_overlap=200, separators=None, length_function=len):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), "
+                             f"should be smaller.")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or DEFAULT_SEPARATORS
+        self.length_function = length_function
+
+    def split_offsets(self, text):
+        """
+        Returns a list of (start, end) offsets, one per chunk.
+        """
+        lengths = {}
+
+        def length(start, end):
+            # Token counting is expensive, so every span is measured once per call
+            key = (start, end)
+            if key not in lengths:
+                lengths[key] = self.length_function(text[start:end])
+            return lengths[key]
+
+        return self._split(text, 0, len(text), self.separators, length)
+
+    def split(self, text):
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def _pieces(self, text, start, end, separator):
+        """
+        Splits text[start:end] on separator, keeping it at the start of the following piece.
+        """
+        if separator == "":
+            return [(i, i + 1) for i in range(start, end)]
+
+        pieces = []
+        piece_start = start
+        position = text.find(separator, start, end)
+        while position != -1:
+            if position > piece_start:
+                pieces.append((piece_start, position))
+            piece_start = position
+            position = text.find(separator, position + len(separator), end)
+        if end > piece_start:
+            pieces.append((piece_start, end))
+        return pieces
+
+    def _split(self, text, start, end, separators, length):
+        # Pick the first separator that occurs in this span
+        separator = separators[-1]
+        new_separators = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+
+        chunks = []
+        good_pieces = []
+        for piece in self._pieces(text, start, end, separator):
+            if length(*piece) < self.chunk_size:
+                good_pieces.append(piece)
+                continue
+
+            if good_pieces:
+                chunks.extend(self._merge(text, good_pieces, length))
+                good_pieces = []
+            if not new_separators:
+                chunks.append(piece)
+            else:
+                chunks.extend(self._split(text, piece[0], piece[1], new_separators, length))
+
+        if good_pieces:
+            chunks.extend(self._merge(text, good_pieces, length))
+        return chunks
+
+    def _merge(self, text, pieces, length):
+        """
+        Greedily merges consecutive pieces into chunks, carrying over up to chunk_overlap.
+        """
+        chunks = []
+        current = deque()
+        total = 0
+        for piece in pieces:
+            piece_length = length(*piece)
+            if total + piece_length > self.chunk_size and current:
+                chunk = self._strip(text, current[0][0], current[-1][1])
+                if chunk:
+                    chunks.append(chunk)
+
+                # Drop pieces from the front until only the overlap remains
+                while total > self.chunk_overlap or (total + piece_length > self.chunk_size and total > 0):
+                    total -= length(*current.popleft())
+            current.append(piece)
+            total += piece_length
+
+        if current:
+            chunk = self._strip(text, current[0][0], current[-1][1])
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def _strip(self, text, start, end):
+        """
+        Offset equivalent of str.strip(); returns None for whitespace-only spans.
+        """
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
@@ -0,0 +1,176 @@
+import re
+import threading
+
+import numpy as np
+from lexical import BM25
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_OVERLAP = 20
+
+
+def overlap(a, b, min_overlap=MIN_OVERLAP):
+    """
+    Returns the length of the longest suffix of a that is a prefix of b (0 if shorter than min_overlap).
+    """
+    if len(a) < min_overlap or len(b) < min_overlap:
+        return 0
+    head = b[:min_overlap]
+    position = a.find(head)
+    while position != -1:
+        length = len(a) - position
+        if length <= len(b) and b.startswith(a[position:]):
+            return length
+        position = a.find(head, position + 1)
+    return 0
+
+
+def combine(a, b):
+    """
+    Joins two chunks of the same page when one contains or overlaps the other, otherwise returns None.
+    """
+    if b in a:
+        return a
+    if a in b:
+        return b
+    length = overlap(a, b)
+    if length:
+        return a + b[length:]
+    length = overlap(b, a)
+    if length:
+        return b + a[length:]
+    return None
+
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into as few prompt tokens as possible.
+
+    Chunks from the same page become one source block: duplicates are dropped
+    and overlapping chunks are stitched back into continuous text. When the
+    prompt is over `max_tokens` (counted with the generator's own tokenizer),
+    whole sentences are removed, from the end of the lowest-ranked block, or,
+    with `drop_sentences`, lowest BM25 score against the question first.
+    """
+    def __init__(self, tokenizer, max_tokens=None, drop_sentences=False):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.drop_sentences = drop_sentences
+        # Packing runs on several threads (pipelined batches, the server), so counters are updated under a lock
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def count(self, text):
+        return len(self.tokenizer.encode(text))
+
+    def merge(self, hits):
+        """
+        Returns one (title, text, score) block per page, ordered by the page's best hit.
+        """
+        pages = {}
+        for title, chunk, score in hits:
+            page = pages.setdefault(title, {'pieces': [], 'score': score})
+            page['score'] = min(page['score'], score)
+
+            # Fold the chunk into an existing piece, then let pieces it now bridges merge too
+            pieces = page['pieces']
+            pieces.append(chunk)
+            merged = True
+            while merged:
+                merged = False
+                for i in range(len(pieces)):
+                    for j in range(i + 1, len(pieces)):
+                        combined = combine(pieces[i], pieces[j])
+                        if combined is not None:
+                            pieces[i] = combined
+                            del pieces[j]
+                            merged = True
+                            break
+                    if merged:
+                        break
+
+        return [(title, ' ... '.join(page['pieces']), page['score']) for title, page in pages.items()]
+
+    def pack(self, hits, query, build_prompt):
+        """
+        Returns packed blocks for build_prompt(blocks, query) and records the token savings.
+
+        build_prompt is called for every candidate, so it should be an untraced formatter
+        (retriever.format_prompt); the caller builds the final prompt once.
+        """
+        blocks = self.merge(hits)
+        if self.max_tokens and self.count(build_prompt(blocks, query)) > self.max_tokens:
+            blocks = self.fit(blocks, query, build_prompt)
+
+        before = self.count(build_prompt(hits, query))
+        after = self.count(build_prompt(blocks, query))
+        with self._lock:
+            self.prompts += 1
+            self.tokens_before += before
+            self.tokens_after += after
+        return blocks
+
+    def fit(self, blocks, query, build_prompt):
+        """
+        Removes sentences until the prompt fits in max_tokens.
+        """
+        sentences = [SENTENCE_END.split(text) for _, text, _ in blocks]
+
+        # Removal order: (block, sentence) pairs, the first ones go first
+        positions = [(b, s) for b in range(len(blocks)) for s in range(len(sentences[b]))]
+        if self.drop_sentences:
+            scores = BM25([sentences[b][s] for b, s in positions]).scores(query)
+            # Least relevant first; among equals, later blocks and later sentences first
+            order = sorted(range(len(positions)), key=lambda i: (scores[i], -positions[i][0], -positions[i][1]))
+            removal = [positions[i] for i in order]
+        else:
+            removal = positions[::-1]
+
+        kept = [np.ones(len(block_sentences), dtype=bool) for block_sentences in sentences]
+
+        def packed():
+            result = []
+            for (title, _, score), block_sentences, keep in zip(blocks, sentences, kept):
+                text = ' '.join(sentence for sentence, k in zip(block_sentences, keep) if k)
+                if text:
+                    result.append((title, text, score))
+            return result
+
+        # Drop a batch of sentences per tokenizer call, sized by how far over budget we are
+        # and by the tokens an average remaining sentence costs, so we rarely overshoot
+        overhead = self.count(build_prompt([], query))
+        removed = 0
+        current = packed()
+        while removed < len(removal):
+            total = self.count(build_prompt(current, query))
+            excess = total - self.max_tokens
+            if excess <= 0:
+                break
+            per_sentence = max(1.0, (total - overhead) / (len(removal) - removed))
+            step = max(1, int(excess / per_sentence))
+            for b, s in removal[removed:removed + step]:
+                kept[b][s] = False
+            removed += step
+            current = packed()
+        return current
+
+    def stats(self):
+        with self._lock:
+            prompts, before, after = self.prompts, self.tokens_before, self.tokens_after
+        saved = before - after
+        return {
+            'prompts': prompts,
+            'tokens_before': before,
+            'tokens_after': after,
+            'tokens_saved': saved,
+            'saved_ratio': saved / before if before else 0.0
+        }
+
+    def report(self):
+        stats = self.stats()
+        if stats['prompts']:
+            print(f"[Packer] {stats['prompts']} prompts: {stats['tokens_before']} -> {stats['tokens_after']} "
+                  f"prompt tokens ({stats['saved_ratio']:.1%} saved)")
@@ -0,0 +1,234 @@
+import argparse
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from retriever import Retriever
+from page_cache import PageCache
+from segment_store import SegmentStore
+from vector_store import CompressedVectorStore, CODES
+
+
+class CorpusIndex:
+    """
+    Persistent chunk-level FAISS index over a fixed list of Wikipedia pages.
+
+    Chunk text, metadata and vectors live in an append-only SegmentStore under
+    `store/`; the index is derived from it. Only the segment number and byte
+    offset of each row's metadata line are kept in memory (12 bytes per row),
+    and a search reads just its hits' lines. By default it is an HNSW graph over
+    the float32 vectors (`chunks.index`); with `codes='pq'` or `codes='int8'`
+    it is a CompressedVectorStore under `vectors/` that keeps only compressed
+    codes in memory. Vectors are L2-normalized and searched by inner product,
+    so scores are cosine similarities and can be compared against a fallback
+    threshold.
+    """
+    INDEX_FILE = 'chunks.index'
+    VECTORS_DIR = 'vectors'
+    STORE_DIR = 'store'
+
+    def __init__(self, index_dir='data/corpus', hnsw_m=32, ef_search=64, codes=None, rerank=10):
+        self.index_dir = index_dir
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.codes = codes
+        self.rerank = rerank
+        self.index = None
+        self.store = None
+        self.row_segments = np.zeros(0, dtype='uint32')
+        self.row_offsets = np.zeros(0, dtype='int64')
+
+    @classmethod
+    def load(cls, index_dir='data/corpus', ef_search=64, rerank=10):
+        corpus = cls(index_dir, ef_search=ef_search, rerank=rerank)
+        corpus.index = corpus._load_index()
+
+        # Index row ids follow the store's row order
+        corpus.store = corpus.open_store(corpus.index.d)
+        corpus.row_segments, corpus.row_offsets = corpus.store.row_offsets()
+        return corpus
+
+    def _load_index(self):
+        """
+        Opens whichever index the last rebuild wrote.
+        """
+        vectors_dir = os.path.join(self.index_dir, self.VECTORS_DIR)
+        if os.path.exists(os.path.join(vectors_dir, CompressedVectorStore.META_FILE)):
+            index = CompressedVectorStore.load(vectors_dir, rerank=self.rerank)
+            self.codes = index.codes
+            return index
+        index = faiss.read_index(os.path.join(self.index_dir, self.INDEX_FILE))
+        index.hnsw.efSearch = self.ef_search
+        return index
+
+    def open_store(self, dim, **kwargs):
+        return SegmentStore(os.path.join(self.index_dir, self.STORE_DIR), dim, **kwargs)
+
+    def build(self, retriever, page_urls, chunk_size=1024, chunk_overlap=200, batch_pages=64, checkpoint_every=500):
+        """
+        Ingests every page not yet in the store, then rebuilds the index from the store.
+
+        Interrupted runs resume from the store's last checkpoint, skipping finished URLs.
+        """
+        store = self.ingest(retriever, page_urls, chunk_size, chunk_overlap, batch_pages, checkpoint_every)
+        self.rebuild(store)
+
+    def ingest(self, retriever, page_urls, chunk_size=1024, chunk_overlap=200, batch_pages=64, checkpoint_every=500):
+        """
+        Scrapes, embeds and appends every page not yet in the store, and returns the closed store.
+
+        The index is not rebuilt, so pages can be ingested in many calls (e.g. as a crawl finds them).
+        """
+        dim = retriever.embedder.get_sentence_embedding_dimension()
+        store = self.open_store(dim, checkpoint_every=checkpoint_every)
+        pending = [url for url in dict.fromkeys(page_urls) if not store.is_done(url)]
+        print(f"{len(page_urls) - len(pending)} pages already ingested, {len(pending)} to go")
+
+        def scrape(url):
+            try:
+                return url, retriever.wiki_scraper.scrape_page(url)
+            except Exception as e:
+                print(f"Error scraping {url}: {e}")
+                return url, None
+
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                for start in range(0, len(pending), batch_pages):
+                    batch = pending[start:start + batch_pages]
+
+                    # Step 1: Scrape and chunk a batch of pages
+                    pages, chunks = [], []
+                    for url, page in pool.map(scrape, batch):
+                        if page is None:
+                            continue
+                        title, text = page
+                        page_chunks = [(title, chunk) for chunk in
+                                       retriever.split_text_into_chunks(text, chunk_size, chunk_overlap)]
+                        pages.append((url, len(page_chunks)))
+                        chunks.extend(page_chunks)
+
+                    # Step 2: Embed the whole batch at once
+                    if chunks:
+                        embeddings, _ = retriever.embed_chunks(chunks, chunk_size, chunk_overlap)
+                        embeddings = np.array(embeddings, dtype='float32')
+                        faiss.normalize_L2(embeddings)
+                    else:
+                        embeddings = np.zeros((0, dim), dtype='float32')
+
+                    # Step 3: Append each page to the store
+                    offset = 0
+                    for url, count in pages:
+                        entries = [{'url': url, 'title': title, 'text': chunk}
+                                   for title, chunk in chunks[offset:offset + count]]
+                        store.add_page(url, entries, embeddings[offset:offset + count])
+                        offset += count
+                    done = min(start + batch_pages, len(pending))
+                    print(f"Ingested {done}/{len(pending)} pages, {store.rows} chunks")
+        finally:
+            # Checkpoint whatever finished, so an interrupted run resumes from here
+            store.close()
+        return store
+
+    def rebuild(self, store, train_rows=65536):
+        """
+        Builds the index from the store in one streaming pass and saves it.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_path = os.path.join(self.index_dir, self.INDEX_FILE)
+        vectors_dir = os.path.join(self.index_dir, self.VECTORS_DIR)
+        if self.codes:
+            # Codes are fitted to an evenly spaced sample of at most train_rows vectors
+            step = max(1, store.rows // train_rows)
+            sample = np.concatenate([np.zeros((0, store.dim), dtype='float32')] +
+                                    [vectors[::step] for vectors in store.iter_vectors()])
+            self.index = CompressedVectorStore(vectors_dir, store.dim, self.codes, rerank=self.rerank)
+            self.index.train(sample)
+        else:
+            self.index = faiss.IndexHNSWFlat(store.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efSearch = self.ef_search
+
+        for vectors in store.iter_vectors():
+            self.index.add(np.ascontiguousarray(vectors))
+        self.store = store
+        self.row_segments, self.row_offsets = store.row_offsets()
+
+        # Only one kind of index is kept, so load() opens the one just built
+        if self.codes:
+            self.index.close()
+            if os.path.exists(index_path):
+                os.remove(index_path)
+        else:
+            faiss.write_index(self.index, index_path)
+            shutil.rmtree(vectors_dir, ignore_errors=True)
+
+    def compact(self):
+        """
+        Compacts the underlying store and rebuilds the index (of the same kind), whose row ids change.
+        """
+        store = self.open_store(self._load_index().d)
+        store.compact()
+        self.rebuild(store)
+
+    def search(self, query_embeddings, top_k=5):
+        """
+        Returns, per query, a list of (title, chunk_text, cosine_similarity) hits.
+        """
+        query_embeddings = np.array(query_embeddings, dtype='float32').reshape(-1, self.index.d)
+        faiss.normalize_L2(query_embeddings)
+        scores, indices = self.index.search(query_embeddings, top_k)
+
+        results = []
+        for row_scores, row_indices in zip(scores, indices):
+            hits = []
+            for score, idx in zip(row_scores, row_indices):
+                if idx < 0:
+                    continue
+                entry = self.store.read_metadata(int(self.row_segments[idx]), int(self.row_offsets[idx]))
+                hits.append((entry['title'], entry['text'], float(score)))
+            results.append(hits)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query an offline chunk-level Wikipedia index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Ingest a list of page URLs (one per line); resumes if interrupted')
+    build_parser.add_argument('pages', help='Path to a file with one Wikipedia URL per line')
+    build_parser.add_argument('--out', default='data/corpus', help='Directory to write the index to')
+    build_parser.add_argument('--chunk-size', type=int, default=1024)
+    build_parser.add_argument('--chunk-overlap', type=int, default=200)
+    build_parser.add_argument('--codes', choices=CODES, default=None,
+                              help='Keep only product-quantized (pq) or int8 codes in memory instead of an HNSW graph')
+
+    compact_parser = subparsers.add_parser('compact', help='Merge segments, drop superseded pages and rebuild the index')
+    compact_parser.add_argument('--index', default='data/corpus', help='Directory of the index')
+
+    query_parser = subparsers.add_parser('query', help='Search an existing index')
+    query_parser.add_argument('question')
+    query_parser.add_argument('--index', default='data/corpus', help='Directory of the index')
+    query_parser.add_argument('--top-k', type=int, default=5)
+    query_parser.add_argument('--rerank', type=int, default=10,
+                              help='With --codes, candidates rescored exactly per result (top-k * rerank)')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        CorpusIndex(args.index).compact()
+        return
+
+    retriever = Retriever(page_cache=PageCache())
+    if args.command == 'build':
+        with open(args.pages, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()]
+        CorpusIndex(args.out, codes=args.codes).build(retriever, urls, args.chunk_size, args.chunk_overlap)
+    else:
+        corpus = CorpusIndex.load(args.index, rerank=args.rerank)
+        q_emb = retriever.embedder.encode([args.question], convert_to_tensor=False)
+        for title, chunk, score in corpus.search(q_emb, args.top_k)[0]:
+            print(f"[{score:.3f}] {title}: {chunk[:200]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urldefrag
+
+import numpy as np
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+START_CATEGORY = "https://en.wikipedia.org/wiki/Category:Video_games"
+
+# Namespaces of non-article pages; titles such as "Doom: The Dark Ages" contain colons too
+NAMESPACES = {'Category', 'File', 'Image', 'Template', 'Help', 'Wikipedia', 'WP', 'Special', 'Talk', 'User',
+              'Portal', 'Draft', 'Module', 'MediaWiki', 'TimedText', 'Book', 'Media'}
+NAMESPACE = re.compile(r'^/wiki/([A-Za-z_]+):')
+
+
+def wiki_namespace(href):
+    """
+    Returns the namespace of a /wiki/ link ('Category', 'User_talk', ...), or None for an article.
+    """
+    match = NAMESPACE.match(href)
+    if not match:
+        return None
+    name = match.group(1)
+    if name in NAMESPACES or name.endswith('_talk'):
+        return name
+    return None
+
+
+class UrlSet:
+    """
+    Set of URLs kept as 8-byte BLAKE2b hashes.
+
+    Hashes live in a sorted uint64 array (8 bytes per URL) plus a small set of
+    recent additions that is merged into the array once it grows past
+    `merge_every`. Two distinct URLs collide with probability about n^2 / 2^65,
+    negligible even for millions of URLs.
+    """
+    def __init__(self, merge_every=65536):
+        self.merge_every = merge_every
+        self._sorted = np.zeros(0, dtype='uint64')
+        self._recent = set()
+
+    @staticmethod
+    def key(url):
+        return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def _in_sorted(self, key):
+        i = np.searchsorted(self._sorted, np.uint64(key))
+        return i < len(self._sorted) and int(self._sorted[i]) == key
+
+    def __contains__(self, url):
+        key = self.key(url)
+        return key in self._recent or self._in_sorted(key)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def add(self, url):
+        """
+        Adds url and returns True if it was not in the set yet.
+        """
+        key = self.key(url)
+        if key in self._recent or self._in_sorted(key):
+            return False
+        self._recent.add(key)
+        if len(self._recent) >= self.merge_every:
+            recent = np.fromiter(self._recent, dtype='uint64', count=len(self._recent))
+            self._sorted = np.union1d(self._sorted, recent)
+            self._recent.clear()
+        return True
+
+
+class RateLimiter:
+    """
+    Spaces requests from all threads at least 1 / rate seconds apart.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        # Sleep outside the lock, so the next caller can reserve the slot after ours
+        time.sleep(max(0.0, slot - now))
+
+
+class CategoryCrawler:
+    """
+    Resumable breadth-first crawl of a Wikipedia category tree.
+
+    The frontier is persistent. Every category page found so far (subcategories
+    and "next page" pagination links alike) is appended to `frontier.log` with
+    its depth. Fetched ones are appended to `done.log`, and article links to
+    `pages.log`. Each frontier entry is fetched exactly once by a pool of
+    workers that share one rate limit, and its links and pagination come from
+    that single response. A checkpoint syncs the logs and atomically rewrites
+    `manifest.json` with their lengths. On open, anything written after the
+    last checkpoint is truncated away, and the crawl resumes with every
+    frontier entry not yet in `done.log`. Seen URLs are deduplicated with
+    UrlSet. Categories that fail are retried on the next run.
+    """
+    MANIFEST_FILE = 'manifest.json'
+    FRONTIER_FILE = 'frontier.log'
+    DONE_FILE = 'done.log'
+    PAGES_FILE = 'pages.log'
+
+    def __init__(self, state_dir='data/crawl', workers=4, rate=1.0, max_depth=None, checkpoint_every=50,
+                 timeout=10, retries=3, backoff=1.0):
+        self.state_dir = state_dir
+        self.workers = workers
+        self.max_depth = max_depth
+        self.checkpoint_every = checkpoint_every
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'WikiGameScraper/1.0 (https://yourdomain.example/)'
+        })
+        # Retry transient failures and 429s, honouring Retry-After
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET'])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.fetched = 0
+        self.errors = 0
+        os.makedirs(state_dir, exist_ok=True)
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _load(self):
+        """
+        Truncates the logs to the last checkpoint and rebuilds the frontier and seen sets from them.
+        """
+        sizes = {}
+        manifest_path = self._file(self.MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                sizes = json.load(f)
+        for name in (self.FRONTIER_FILE, self.DONE_FILE, self.PAGES_FILE):
+            with open(self._file(name), 'ab') as f:
+                f.truncate(sizes.get(name, 0))
+
+        self.done = UrlSet()
+        with open(self._file(self.DONE_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                self.done.add(line.rstrip('\n'))
+
+        self.categories = UrlSet()
+        self.pending = deque()
+        with open(self._file(self.FRONTIER_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                depth, url = line.rstrip('\n').split('\t', 1)
+                self.categories.add(url)
+                if url not in self.done:
+                    self.pending.append((int(depth), url))
+
+        self.pages = UrlSet()
+        with open(self._file(self.PAGES_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                self.pages.add(line.rstrip('\n'))
+
+        self._handles = {name: open(self._file(name), 'a', encoding='utf-8')
+                         for name in (self.FRONTIER_FILE, self.DONE_FILE, self.PAGES_FILE)}
+
+    def add_category(self, url, depth=0):
+        """
+        Queues a category page unless it was seen before; returns True if it was new.
+        """
+        if not self.categories.add(url):
+            return False
+        self._handles[self.FRONTIER_FILE].write(f"{depth}\t{url}\n")
+        self.pending.append((depth, url))
+        return True
+
+    def iter_pages(self):
+        """
+        Yields every page URL found so far, in discovery order.
+        """
+        self._handles[self.PAGES_FILE].flush()
+        with open(self._file(self.PAGES_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    def fetch_category(self, url):
+        """
+        Fetches one category page and returns (page_urls, subcategory_urls, next_page_url).
+        """
+        self.limiter.wait()
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        soup = BeautifulSoup(resp.text, 'html.parser')
+
+        def links(selector, namespace):
+            for link in soup.select(selector):
+                href = link.get('href')
+                if href and href.startswith('/wiki/') and wiki_namespace(href) == namespace:
+                    yield urldefrag(urljoin(url, href))[0]
+
+        pages = list(links('div#mw-pages a[href]', None))
+        subcategories = list(links('div#mw-subcategories a[href]', 'Category'))
+
+        # Pagination is queued like any other category page instead of being followed here
+        next_link = soup.find('a', string='next page')
+        next_page = urljoin(url, next_link['href']) if next_link and next_link.get('href') else None
+        return pages, subcategories, next_page
+
+    def _record(self, depth, url, pages, subcategories, next_page):
+        """
+        Appends a fetched category's results to the logs; returns the page URLs not seen before.
+        """
+        if next_page:
+            self.add_category(next_page, depth)
+        if self.max_depth is None or depth < self.max_depth:
+            for subcategory in subcategories:
+                self.add_category(subcategory, depth + 1)
+
+        new_pages = [page for page in pages if self.pages.add(page)]
+        self._handles[self.PAGES_FILE].writelines(f"{page}\n" for page in new_pages)
+
+        # Written last, so a checkpointed "done" always comes with everything it discovered
+        self._handles[self.DONE_FILE].write(f"{url}\n")
+        self.done.add(url)
+        self.fetched += 1
+        return new_pages
+
+    def crawl(self):
+        """
+        Crawls until the frontier is empty, yielding lists of newly found page URLs.
+
+        Each list is yielded right after a checkpoint, so every yielded URL is already
+        durable in pages.log. Fetches stay in flight while the caller handles a list.
+        """
+        new_pages = []
+        in_flight = {}
+        since_checkpoint = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawl') as pool:
+                while self.pending or in_flight:
+                    # Step 1: Keep every worker busy
+                    while self.pending and len(in_flight) < self.workers:
+                        depth, url = self.pending.popleft()
+                        in_flight[pool.submit(self.fetch_category, url)] = (depth, url)
+
+                    # Step 2: Record finished fetches; only this thread touches the logs
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        depth, url = in_flight.pop(future)
+                        try:
+                            pages, subcategories, next_page = future.result()
+                        except Exception as e:
+                            print(f"Error at category {url}: {e}")
+                            self.errors += 1
+                            continue
+                        new_pages.extend(self._record(depth, url, pages, subcategories, next_page))
+                        since_checkpoint += 1
+
+                    # Step 3: Checkpoint and hand over the pages found since the last one
+                    if since_checkpoint >= self.checkpoint_every or not (self.pending or in_flight):
+                        self.checkpoint()
+                        since_checkpoint = 0
+                        print(f"[Checkpoint] {len(self.pages)} pages, {len(self.done)} category pages done, "
+                              f"{len(self.pending)} queued")
+                        if new_pages:
+                            yield new_pages
+                            new_pages = []
+        finally:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Makes the logs durable and records their lengths in a new manifest.
+        """
+        sizes = {}
+        for name, handle in self._handles.items():
+            handle.flush()
+            os.fsync(handle.fileno())
+            sizes[name] = os.path.getsize(self._file(name))
+
+        tmp_path = self._file(self.MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sizes, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(self.MANIFEST_FILE))
+
+    def close(self):
+        self.checkpoint()
+        for handle in self._handles.values():
+            handle.close()
+
+    def report(self):
+        print(f"[Crawler] {self.fetched} category pages fetched this run, {self.errors} errors, "
+              f"{len(self.pages)} pages and {len(self.categories)} category pages seen, {len(self.pending)} queued")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl a Wikipedia category tree for page URLs; resumes if interrupted')
+    parser.add_argument('start', nargs='?', default=START_CATEGORY, help='Category URL to start from')
+    parser.add_argument('--state', default='data/crawl',
+                        help='Directory for the frontier, the logs and the found pages (pages.log)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent category fetches')
+    parser.add_argument('--rate', type=float, default=1.0, help='Most requests per second, across all workers')
+    parser.add_argument('--max-depth', type=int, default=None, help='Deepest subcategory level to follow')
+    parser.add_argument('--checkpoint-every', type=int, default=50, help='Category pages between checkpoints')
+    parser.add_argument('--ingest', default=None, metavar='DIR',
+                        help='Also scrape, embed and store found pages into the corpus index in DIR')
+    parser.add_argument('--chunk-size', type=int, default=1024)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    args = parser.parse_args()
+
+    crawler = CategoryCrawler(args.state, workers=args.workers, rate=args.rate, max_depth=args.max_depth,
+                              checkpoint_every=args.checkpoint_every)
+    crawler.add_category(args.start)
+
+    corpus = retriever = None
+    if args.ingest:
+        # Loads the embedder, so only imported when ingesting
+        from corpus_index import CorpusIndex
+        from page_cache import PageCache
+        from retriever import Retriever
+        corpus = CorpusIndex(args.ingest)
+        retriever = Retriever(page_cache=PageCache())
+
+        # Pages found by an earlier run that stopped before ingesting them (the store skips finished ones)
+        corpus.ingest(retriever, list(crawler.iter_pages()), args.chunk_size, args.chunk_overlap)
+
+    try:
+        for pages in crawler.crawl():
+            if corpus:
+                corpus.ingest(retriever, pages, args.chunk_size, args.chunk_overlap)
+    except KeyboardInterrupt:
+        print("\nCrawl interrupted by user, rerun the same command to resume.")
+    finally:
+        crawler.close()
+        crawler.report()
+
+    if corpus:
+        corpus.rebuild(corpus.open_store(retriever.embedder.get_sentence_embedding_dimension()))
+    print(f"Page list: {os.path.join(args.state, crawler.PAGES_FILE)}")
+
+
+if __name__ == '__main__':
+    main()
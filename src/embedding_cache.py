@@ -0,0 +1,180 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent store of chunk embeddings for one (embedder, chunk_size, chunk_overlap) setting.
+
+    Texts that are not chunks (e.g. reference answers) are kept apart under a
+    `namespace` instead of a chunking setting.
+
+    Vectors are appended to a raw float32 matrix that is memory-mapped for reads,
+    and an offset index maps the SHA-256 of each chunk text to its row. Appends
+    hold an flock on the index, so several processes can share one cache.
+    """
+    def __init__(self, model_name, dim, chunk_size=None, chunk_overlap=None, cache_dir='cache/embeddings',
+                 namespace=None):
+        self.model_name = model_name
+        self.dim = dim
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # One directory per setting, so changing any key component starts a fresh cache
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+        setting = re.sub(r'[^A-Za-z0-9_.-]', '_', namespace) if namespace else f"{chunk_size}-{chunk_overlap}"
+        self.path = os.path.join(cache_dir, f"{safe_name}-{setting}")
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors_path = os.path.join(self.path, 'vectors.f32')
+        self.index_path = os.path.join(self.path, 'index.tsv')
+
+        meta_path = os.path.join(self.path, 'meta.json')
+        meta = {'model': model_name, 'dim': dim, 'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap,
+                'namespace': namespace}
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                if json.load(f)['dim'] != dim:
+                    raise ValueError(f"Embedding cache at {self.path} has a different dimension than {dim}")
+        else:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+        self.offsets = self._load_offsets()
+        self._rows = max(self.offsets.values()) + 1 if self.offsets else 0
+        self._matrix = None
+        self._remap()
+
+    def _load_offsets(self):
+        """
+        Reads the offset index, ignoring rows that never made it into the vector file.
+        """
+        with open(self.index_path, 'ab+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                offsets, stale = self._parse_index(f.read(), self._file_rows())
+
+                # Rewrite the index so dropped rows can't be claimed by later appends
+                if stale:
+                    f.truncate(0)
+                    f.write(b''.join(f"{key}\t{row}\n".encode('utf-8') for key, row in offsets.items()))
+                    f.flush()
+                self._index_bytes = f.tell()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return offsets
+
+    def _file_rows(self):
+        return os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+
+    @staticmethod
+    def _parse_index(data, rows):
+        """
+        Returns ({key: row}, stale) for index lines whose row exists in the vector file.
+        """
+        offsets = {}
+        lines = data.decode('utf-8', errors='replace').split('\n')
+        # Anything after the last newline is a line cut off by an interrupted write
+        stale = bool(lines.pop())
+        for line in lines:
+            parts = line.split('\t')
+            if len(parts) == 2 and parts[1].isdigit() and int(parts[1]) < rows:
+                offsets[parts[0]] = int(parts[1])
+            else:
+                stale = True
+        return offsets, stale
+
+    def _remap(self):
+        if self._rows:
+            self._matrix = np.memmap(self.vectors_path, dtype='float32', mode='r', shape=(self._rows, self.dim))
+        else:
+            self._matrix = None
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, texts, encode):
+        """
+        Returns a float32 matrix of embeddings for texts, calling encode only on unseen ones.
+        """
+        keys = [self.key(text) for text in texts]
+
+        with self._lock:
+            # Collect unseen texts once each, preserving their first occurrence order
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in self.offsets and key not in missing:
+                    missing[key] = text
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        # Encode without the lock, so concurrent callers (e.g. the server's BatchingEmbedder) can merge their encodes
+        if missing:
+            vectors = np.asarray(encode(list(missing.values())), dtype='float32')
+
+        with self._lock:
+            if missing:
+                # Keys another thread stored meanwhile are skipped by _append
+                self._append(list(missing.keys()), vectors)
+
+            if not keys:
+                return np.zeros((0, self.dim), dtype='float32')
+            rows = np.fromiter((self.offsets[key] for key in keys), dtype=np.int64, count=len(keys))
+
+            # Consecutive rows (e.g. a whole cached page) are served straight from the mapping
+            if rows[-1] - rows[0] == len(rows) - 1 and np.all(np.diff(rows) == 1):
+                return self._matrix[rows[0]:rows[-1] + 1]
+            return np.asarray(self._matrix[rows])
+
+    def _append(self, keys, vectors):
+        """
+        Appends vectors to the matrix file, then records their rows in the offset index.
+
+        Other processes may share the cache directory, so everything happens under an exclusive
+        lock on the index file, and rows are placed after whatever the file holds by then.
+        """
+        with open(self.index_path, 'ab+') as index:
+            fcntl.flock(index, fcntl.LOCK_EX)
+            try:
+                # Step 1: Pick up the rows other processes appended since we last read the index
+                start = self._file_rows()
+                index.seek(self._index_bytes)
+                tail = index.read()
+                if tail and not tail.endswith(b'\n'):
+                    # A writer died mid-line; cut the fragment off so our lines start cleanly
+                    index.truncate(self._index_bytes + tail.rfind(b'\n') + 1)
+                appended, _ = self._parse_index(tail, start)
+                self.offsets.update(appended)
+
+                # Step 2: Skip vectors another process stored in the meantime
+                keep = [i for i, key in enumerate(keys) if key not in self.offsets]
+
+                # Step 3: Append at the file's real end, dropping any partial row left by an interrupted write
+                with open(self.vectors_path, 'ab') as f:
+                    f.truncate(start * 4 * self.dim)
+                    f.write(np.ascontiguousarray(vectors[keep]).tobytes())
+                index.write(b''.join(f"{keys[i]}\t{start + n}\n".encode('utf-8') for n, i in enumerate(keep)))
+                index.flush()
+                for n, i in enumerate(keep):
+                    self.offsets[keys[i]] = start + n
+                self._index_bytes = index.tell()
+            finally:
+                fcntl.flock(index, fcntl.LOCK_UN)
+        self._rows = start + len(keep)
+        self._remap()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.offsets)}
+
+    def report(self):
+        stats = self.stats()
+        print(f"[Embedding cache] {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} stored vectors ({self.model_name})")
@@ -0,0 +1,215 @@
+import re
+from html.parser import HTMLParser
+
+# Elements BeautifulSoup closes immediately (html.parser builder)
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer'
+}
+
+# Text inside these never shows up in get_text()
+HIDDEN_ELEMENTS = {'script', 'style', 'template', 'rt', 'rp'}
+
+# Unmatched end tags of these close the content div's ancestors, and so the div itself
+ANCESTOR_ELEMENTS = {'main', 'body', 'html'}
+
+CONTENT_CLASS = 'mw-content-ltr mw-parser-output'
+
+# Cheap prefilters so the parser starts right at the content and title
+CONTENT_START = re.compile(r'<div\b[^>]*\bclass\s*=\s*["\']?\s*mw-content-ltr\s+mw-parser-output\s*["\'\s>]', re.I)
+TITLE_BLOCK = re.compile(r'<h1\b[^>]*\bid\s*=\s*["\']?firstHeading\b[^>]*>(.*?)</h1\s*>', re.I | re.S)
+
+# Same cleanup as the original seven re.sub calls, folded into one alternation:
+# no space after '(', none before ) . , ; : ! ? or ', none after ', and runs collapsed to one space
+REFERENCE = re.compile(r"\[\d+\]")
+SPACING = re.compile(r"(\(\s+)|(\s+(?=[).,;:!?']))|('\s+)|(\s{2,})")
+SPACING_REPLACEMENTS = (None, '(', '', "'", ' ')
+
+
+def clean_paragraph(text):
+    """
+    Removes bracketed references and normalizes spacing around punctuation.
+    """
+    if '[' in text:
+        text = REFERENCE.sub('', text)
+    return SPACING.sub(lambda m: SPACING_REPLACEMENTS[m.lastindex], text)
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _ContentParser(HTMLParser):
+    """
+    Streams through a page and collects the text of plain <p> tags in the content div.
+
+    Mirrors what BeautifulSoup's html.parser tree would give for
+    `content_div.find_all('p', class_=False, id=False)` after decomposing
+    `sup.reference`, without building the tree.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.in_content = False
+        self.stack = []
+        self.paragraphs = []
+        self.open_paragraphs = []
+        self.skip_depth = 0
+        self.pending = []
+
+    def flush(self):
+        """
+        Turns buffered text into one string, like BeautifulSoup's NavigableString.
+        """
+        if self.pending:
+            data = ''.join(self.pending).strip()
+            self.pending = []
+            if data:
+                for paragraph in self.open_paragraphs:
+                    self.paragraphs[paragraph].append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        if not self.in_content:
+            if tag == 'div' and ' '.join((dict(attrs).get('class') or '').split()) == CONTENT_CLASS:
+                self.in_content = True
+                self.stack.append(('div', None, False))
+            return
+
+        if tag in VOID_ELEMENTS:
+            return
+
+        attr_names = {name for name, _ in attrs}
+        skip = tag in HIDDEN_ELEMENTS
+        if tag == 'sup' and 'reference' in (dict(attrs).get('class') or '').split():
+            skip = True
+        paragraph = None
+        if tag == 'p' and 'class' not in attr_names and 'id' not in attr_names:
+            # Paragraphs are tracked by position, which is also find_all()'s order
+            paragraph = len(self.paragraphs)
+            self.paragraphs.append([])
+            self.open_paragraphs.append(paragraph)
+
+        if skip:
+            self.skip_depth += 1
+        self.stack.append((tag, paragraph, skip))
+
+    def handle_startendtag(self, tag, attrs):
+        # <tag/> opens and closes at once, so it contributes no text
+        self.flush()
+        if not self.in_content:
+            self.handle_starttag(tag, attrs)
+            if self.in_content:
+                raise _StopParsing()
+
+    def handle_endtag(self, tag):
+        self.flush()
+        if not self.in_content:
+            return
+
+        # Like BeautifulSoup, an end tag closes everything up to its nearest open match
+        if not any(name == tag for name, _, _ in self.stack):
+            if tag in ANCESTOR_ELEMENTS:
+                raise _StopParsing()
+            return
+        while self.stack:
+            name, paragraph, skip = self.stack.pop()
+            if paragraph is not None:
+                self.open_paragraphs.remove(paragraph)
+            if skip:
+                self.skip_depth -= 1
+            if name == tag:
+                break
+
+        if not self.stack:
+            raise _StopParsing()
+
+    def handle_data(self, data):
+        # The parser may split one text run into several calls
+        if self.open_paragraphs and not self.skip_depth:
+            self.pending.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+
+
+class _TextParser(HTMLParser):
+    """
+    Collects the visible text of a small HTML fragment.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.pending = []
+
+    def flush(self):
+        if self.pending:
+            data = ''.join(self.pending).strip()
+            self.pending = []
+            if data:
+                self.parts.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        if tag in HIDDEN_ELEMENTS:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        self.flush()
+        if tag in HIDDEN_ELEMENTS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.pending.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def close(self):
+        super().close()
+        self.flush()
+
+
+def extract_page(html):
+    """
+    Returns (title, text) for raw Wikipedia HTML, matching WikiScraper's BeautifulSoup output.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    # Paragraph text from the content div only
+    description_texts = []
+    match = CONTENT_START.search(html)
+    parser = _ContentParser()
+    try:
+        parser.feed(html[match.start():] if match else html)
+        parser.close()
+    except _StopParsing:
+        pass
+    parser.flush()
+    for paragraph in parser.paragraphs:
+        text = clean_paragraph(' '.join(paragraph))
+        if text:
+            description_texts.append(text)
+
+    # Page title from the first heading
+    title = "Untitled"
+    match = TITLE_BLOCK.search(html)
+    if match:
+        title_parser = _TextParser()
+        title_parser.feed(match.group(1))
+        title_parser.close()
+        title = ''.join(title_parser.parts)
+
+    return title, " ".join(description_texts)
@@ -0,0 +1,43 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN.findall(text.casefold())
+
+
+class BM25:
+    """
+    Okapi BM25 over a small, per-query set of chunks.
+    """
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.docs = [Counter(tokenize(text)) for text in texts]
+
+        lengths = np.array([sum(doc.values()) for doc in self.docs], dtype='float32')
+        average = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+        self.norm = k1 * (1 - b + b * lengths / average)
+
+        document_frequency = Counter()
+        for doc in self.docs:
+            document_frequency.update(doc.keys())
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query):
+        """
+        Returns one BM25 score per chunk for query.
+        """
+        scores = np.zeros(len(self.docs), dtype='float32')
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            tf = np.array([doc.get(term, 0) for doc in self.docs], dtype='float32')
+            scores += idf * tf * (self.k1 + 1) / (tf + self.norm)
+        return scores
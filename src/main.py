@@ -1,58 +1,205 @@
 import sys
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from rag_model import RAGSystem
+from model_registry import registry, BACKENDS, EMBEDDER_NAME, GENERATOR_NAME
+from batch_pipeline import PipelinedBatchRunner
+from tracing import tracer
+
+# rag_model (torch, transformers, faiss) is imported on the model loading thread, and the HTTP
+# clients (requests, urllib3) only after validate(), so usage errors and argument checks return immediately
+
+# Options that take a value; any other "--name" argument is a boolean flag
+VALUE_OPTIONS = {'--corpus', '--trace', '--metrics-port', '--search', '--search-fallback', '--prefilter',
+                 '--context-tokens', '--answer-cache', '--embedder', '--generator', '--max-new-tokens',
+                 '--backend', '--threads'}
+FLAG_OPTIONS = {'--pack', '--drop-sentences', '--no-prefix-cache'}
+INT_OPTIONS = {'metrics-port', 'prefilter', 'context-tokens', 'max-new-tokens', 'threads'}
+
+def parse_options(argv):
+    """
+    Separates --options from positional arguments.
+    """
+    args, options = [], {}
+    remaining = iter(argv)
+    for arg in remaining:
+        if arg in VALUE_OPTIONS:
+            options[arg[2:]] = next(remaining, None)
+        elif arg.startswith('--'):
+            options[arg[2:]] = True
+        else:
+            args.append(arg)
+    return args, options
+
+def validate(args, options):
+    """
+    Returns an error message for invalid arguments, or None; runs before anything is loaded.
+    """
+    for name, value in options.items():
+        if f"--{name}" not in VALUE_OPTIONS | FLAG_OPTIONS:
+            return f"Unknown option --{name}"
+        if f"--{name}" in VALUE_OPTIONS and value is None:
+            return f"--{name} needs a value"
+        if name in INT_OPTIONS and (not value.isdigit() or int(value) < 1):
+            return f"--{name} must be a positive integer, got {value!r}"
+    if options.get('backend') and options['backend'] not in BACKENDS:
+        return f"--backend must be one of {', '.join(BACKENDS)}, got {options['backend']!r}"
+    if options.get('corpus') and not os.path.isdir(options['corpus']):
+        return f"Corpus directory {options['corpus']} does not exist"
+
+    if len(args) == 2:
+        if not os.path.isfile(args[0]):
+            return f"File {args[0]} does not exist"
+        output_dir = os.path.dirname(os.path.abspath(args[1]))
+        if not os.access(output_dir, os.W_OK):
+            return f"Cannot write {args[1]}"
+    return None
+
+def load_rag(options, search_client, page_cache):
+    """
+    Imports the model stack and loads both models; runs on a background thread.
+    """
+    from rag_model import RAGSystem
+    rag = RAGSystem(corpus_dir=options.get('corpus'),
+                    embedder_name=options.get('embedder') or EMBEDDER_NAME,
+                    generator_name=options.get('generator') or GENERATOR_NAME,
+                    max_new_tokens=int(options.get('max-new-tokens') or 256),
+                    search_client=search_client, page_cache=page_cache,
+                    prefilter_top_n=int(options['prefilter']) if options.get('prefilter') else None,
+                    pack_context=bool(options.get('pack')),
+                    context_tokens=int(options['context-tokens']) if options.get('context-tokens') else None,
+                    drop_sentences=bool(options.get('drop-sentences')),
+                    cache_prefix=not options.get('no-prefix-cache'),
+                    answer_cache_dir=options.get('answer-cache'),
+                    backend=options.get('backend') or 'auto',
+                    threads=int(options['threads']) if options.get('threads') else None)
+    rag.initialize_models()
+    return rag
+
+def prefetch(search_client, page_cache, query, num_results=5):
+    """
+    Searches and scrapes for query ahead of the pipeline, filling the caches it reads from.
+    """
+    from wiki_scraper import WikiScraper
+    try:
+        links = search_client.search(query, num_results)
+    except Exception:
+        # The pipeline searches again and reports the failure itself
+        return
+    scraper = WikiScraper(cache=page_cache)
+    with ThreadPoolExecutor(max_workers=max(1, len(links))) as pool:
+        for future in [pool.submit(scraper.scrape_page, link) for link in links]:
+            try:
+                future.result()
+            except Exception:
+                pass
 
 def main():
-    if len(sys.argv) < 2:
+    args, options = parse_options(sys.argv[1:])
+    if len(args) < 1 or len(args) > 2:
         print("Usage:")
         print("1. Single query: python src/main.py \"your question\"")
         print("2. Batch from file: python src/main.py input.txt")
         print("3. Batch with output: python src/main.py input.txt output.txt")
+        print("Options:")
+        print("  --corpus DIR   Answer from a prebuilt corpus index, falling back to live retrieval")
+        print("  --search URL[,URL...]   searx endpoints to query, in order of preference")
+        print("  --search-fallback URL   Search endpoint used only when all --search endpoints fail")
+        print("  --prefilter N  Embed only the N best BM25 matches per query and rank them by a hybrid score")
+        print("  --pack         Merge overlapping chunks of the same page into one source block")
+        print("  --context-tokens N   Pack and trim the prompt to at most N tokens (implies --pack)")
+        print("  --drop-sentences     When trimming, drop the sentences least related to the question first")
+        print("  --no-prefix-cache    Prefill the instruction preamble for every prompt instead of reusing its cache")
+        print("  --answer-cache DIR   Reuse earlier answers (kept in DIR) for repeated and paraphrased questions")
+        print("  --embedder NAME      Sentence embedding model name or path")
+        print("  --generator NAME     Causal LM name or path")
+        print("  --max-new-tokens N   Longest answer in tokens (default 256)")
+        print("  --backend NAME       auto (float16, GPU if present), cpu (float32) or cpu-int8 (int8 quantized)")
+        print("  --threads N          CPU threads for the cpu backends (default: CPUs available to this process)")
+        print("  --trace FILE   Append per-stage spans to FILE as JSON lines")
+        print("  --metrics-port PORT   Serve Prometheus metrics at http://localhost:PORT/metrics while running")
         sys.exit(1)
 
-    # Initialize the Retrieval-Augmented Generation (RAG) system
-    rag = RAGSystem()
-    rag.initialize_models()
+    # Check every argument before any model work, so a typo costs milliseconds rather than a model load
+    error = validate(args, options)
+    if error:
+        print(f"Error: {error}")
+        sys.exit(1)
+
+    # Mode 1 answers args[0] itself; modes 2 and 3 read one query per line
+    queries = None
+    if len(args) == 2 or os.path.exists(args[0]):
+        with open(args[0], 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        if not queries:
+            print(f"Error: {args[0]} contains no questions")
+            sys.exit(1)
+
+    # Tracing stays off (and free) unless one of its outputs is requested
+    if options.get('trace') or options.get('metrics-port'):
+        tracer.enable(options.get('trace'))
+    if options.get('metrics-port'):
+        tracer.serve_metrics(int(options['metrics-port']))
+
+    # Initialize the Retrieval-Augmented Generation (RAG) system on a background thread
+    from search_client import SearchClient
+    from page_cache import PageCache
+    search_endpoints = options['search'].split(',') if options.get('search') else None
+    search_fallback = SearchClient([options['search-fallback']]) if options.get('search-fallback') else None
+    search_client = SearchClient(search_endpoints, fallback=search_fallback)
+    page_cache = PageCache()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader') as loader:
+        loading = loader.submit(load_rag, options, search_client, page_cache)
+
+        # Meanwhile search and scrape for the first question (a prebuilt corpus usually answers it without)
+        if not options.get('corpus'):
+            prefetch(search_client, page_cache, queries[0] if queries else args[0])
+        rag = loading.result()
+    registry.report()
 
     # -------- Mode 1 or 2: Single query or input file --------
-    if len(sys.argv) == 2:
-        input_arg = sys.argv[1]
-        if os.path.exists(input_arg):
+    if len(args) == 1:
+        if queries is not None:
             # Mode 2: Input file (one query per line), print results to console
-            with open(input_arg, 'r', encoding='utf-8') as f:
-                queries = [line.strip() for line in f if line.strip()]
-            for query in queries:
-                result = rag.generate_response_with_retriever(query, top_k=5)
+            # Retrieval for upcoming queries overlaps with generation of the current one
+            runner = PipelinedBatchRunner(rag, top_k=5)
+            for query, result in runner.run(queries):
                 print(f"Q: {query}\nA: {result}\n{'=' * 50}\n")
+            runner.report()
         else:
-            # Mode 1: Single query passed directly as argument
-            query = input_arg
-            result = rag.generate_response_with_retriever(query, top_k=5)
-            print(result)
+            # Mode 1: Single query passed directly as argument, answer printed as it is generated
+            query = args[0]
+            for piece in rag.stream_response_with_retriever(query, top_k=5):
+                print(piece, end='', flush=True)
+            print()
+            rag.report_stream()
 
     # -------- Mode 3: Batch input with output file --------
-    elif len(sys.argv) == 3:
-        input_file = sys.argv[1]
-        output_file = sys.argv[2]
+    elif len(args) == 2:
+        output_file = args[1]
         timestamp = int(time.time() * 1000)
         model_answers_filename = f"model_answers_{timestamp}.txt"
 
-        # Read input queries and prepare output files
-        with open(input_file, 'r', encoding='utf-8') as f_in, \
-             open(output_file, 'w', encoding='utf-8') as f_out, \
+        # Prepare output files
+        with open(output_file, 'w', encoding='utf-8') as f_out, \
              open(model_answers_filename, 'w', encoding='utf-8') as f_model:
 
-            queries = [line.strip() for line in f_in if line.strip()]
-            for query in queries:
-                result = rag.generate_response_with_retriever(query, top_k=5)
-
+            runner = PipelinedBatchRunner(rag, top_k=5)
+            for query, result in runner.run(queries):
                 # Output full Q&A for user readability
                 f_out.write(f"Q: {query}\nA: {result}\n{'=' * 50}\n\n")
-                
+
                 # Output model answers only (for metrics or evaluation)
                 f_model.write(f"{result}\n")
 
+        runner.report()
+
+    rag.retriever.report()
+    if rag.packer:
+        rag.packer.report()
+    if rag.answer_cache:
+        rag.answer_cache.report()
+
 if __name__ == "__main__":
     main()
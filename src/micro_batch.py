@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Groups concurrent submissions into batches handled by one worker thread.
+
+    The worker takes the first waiting item, then keeps collecting until it has
+    `max_batch_size` items or `max_wait` seconds have passed, and hands the
+    whole list to `process`, which must return one result per item.
+    """
+    def __init__(self, name, process, max_batch_size=8, max_wait=0.01):
+        self.name = name
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.in_flight = 0
+        self.batches = 0
+        self.items = 0
+        self.thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        """
+        Queues item and blocks until its result is ready.
+        """
+        future = Future()
+        self.queue.put((item, future))
+        return future.result()
+
+    def depth(self):
+        return self.queue.qsize() + self.in_flight
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.in_flight = len(batch)
+            try:
+                results = self.process([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            finally:
+                self.in_flight = 0
+                self.batches += 1
+                self.items += len(batch)
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0
+        }
+
+
+class BatchingEmbedder:
+    """
+    Stands in for a SentenceTransformer so that concurrent encode() calls share one forward pass.
+
+    Everything except encode() is passed through to the wrapped model.
+    """
+    def __init__(self, embedder, max_batch_size=16, max_wait=0.005):
+        self.embedder = embedder
+        self.batcher = MicroBatcher('embedding', self._encode_many, max_batch_size, max_wait)
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self.batcher.submit([sentences])[0]
+        return self.batcher.submit(list(sentences))
+
+    def _encode_many(self, requests):
+        texts = [text for request in requests for text in request]
+        embeddings = np.asarray(self.embedder.encode(texts, convert_to_tensor=False, show_progress_bar=False),
+                                dtype='float32')
+
+        # Split the combined batch back into one array per caller
+        results, start = [], 0
+        for request in requests:
+            results.append(embeddings[start:start + len(request)])
+            start += len(request)
+        return results
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+import warnings
+
+# torch, transformers and sentence_transformers are imported by the loaders below, so importing
+# this module (and everything that shares the registry) stays cheap until a model is needed
+
+EMBEDDER_NAME = "all-mpnet-base-v2"
+GENERATOR_NAME = "deepseek-ai/deepseek-llm-7b-chat"
+
+# auto: float16 generator spread over the available devices (GPU nodes)
+# cpu: float32 on the CPU; cpu-int8: cpu with int8 dynamic quantization of every Linear layer
+BACKENDS = ('auto', 'cpu', 'cpu-int8')
+
+
+def _resident_bytes(model):
+    """
+    Approximates the memory held by a model's parameters and buffers.
+    """
+    # Pipelines and tokenizers report nothing; the wrapped model is counted on its own
+    if not hasattr(model, 'parameters'):
+        return None
+    total = sum(p.numel() * p.element_size() for p in model.parameters())
+    total += sum(b.numel() * b.element_size() for b in model.buffers())
+
+    # Dynamically quantized layers keep their int8 weights outside of parameters()
+    for module in model.modules():
+        if hasattr(module, '_packed_params') and callable(getattr(module, 'weight', None)):
+            weight = module.weight()
+            total += weight.numel() * weight.element_size()
+    return total
+
+
+def cpu_threads(threads=None):
+    """
+    Sets torch's thread pools for CPU inference and returns the number of intra-op threads.
+
+    Defaults to the CPUs this process may run on (SLURM_CPUS_PER_TASK or the affinity
+    mask), not every core of the node, so jobs sharing a node don't oversubscribe it.
+    """
+    import torch
+    if threads is None:
+        threads = int(os.environ.get('SLURM_CPUS_PER_TASK') or len(os.sched_getaffinity(0)))
+    torch.set_num_threads(threads)
+    try:
+        # Our own thread pools already run retrieval next to generation
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only allowed before torch starts its first parallel region
+        pass
+    return threads
+
+
+def quantize_int8(model):
+    """
+    Replaces every Linear layer of model with an int8 dynamically quantized one (weights int8, activations quantized per batch).
+    """
+    import torch
+    with warnings.catch_warnings():
+        # Eager-mode quantization is deprecated in favour of torchao, which is not a dependency
+        warnings.simplefilter('ignore')
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _model_key(name, backend):
+    return name if backend == 'auto' else f"{name}@{backend}"
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded models, so every component shares a single copy.
+    """
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _get(self, key, loader):
+        """
+        Returns the cached model for key, loading it exactly once.
+        """
+        # One lock per model so slow loads don't block unrelated lookups
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            if key not in self._models:
+                start = time.perf_counter()
+                model = loader()
+                self._stats[key] = {
+                    'load_seconds': time.perf_counter() - start,
+                    'resident_bytes': _resident_bytes(model)
+                }
+                self._models[key] = model
+            return self._models[key]
+
+    def get_embedder(self, name=EMBEDDER_NAME, backend='auto'):
+        def load():
+            import torch
+            from sentence_transformers import SentenceTransformer
+            if backend != 'auto':
+                embedder = SentenceTransformer(name, device='cpu')
+                return quantize_int8(embedder) if backend == 'cpu-int8' else embedder
+            embedder = SentenceTransformer(name)
+            if torch.cuda.is_available():
+                embedder = embedder.to('cuda')
+            return embedder
+        return self._get(('embedder', _model_key(name, backend)), load)
+
+    def get_tokenizer(self, name=GENERATOR_NAME):
+        def load():
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(name)
+        return self._get(('tokenizer', name), load)
+
+    def get_causal_lm(self, name=GENERATOR_NAME, backend='auto'):
+        def load():
+            import torch
+            from transformers import AutoModelForCausalLM
+            if backend != 'auto':
+                # float16 matmuls are slow or missing on most CPUs
+                model = AutoModelForCausalLM.from_pretrained(name, torch_dtype=torch.float32)
+                model.eval()
+                return quantize_int8(model) if backend == 'cpu-int8' else model
+            return AutoModelForCausalLM.from_pretrained(
+                name,
+                torch_dtype=torch.float16,
+                device_map="auto"
+            )
+        return self._get(('causal_lm', _model_key(name, backend)), load)
+
+    def get_generator(self, name=GENERATOR_NAME, backend='auto'):
+        def load():
+            from transformers import pipeline
+            return pipeline(
+                "text-generation",
+                model=self.get_causal_lm(name, backend),
+                tokenizer=self.get_tokenizer(name),
+                return_full_text=False
+            )
+        return self._get(('generator', _model_key(name, backend)), load)
+
+    def stats(self):
+        """
+        Returns load time and resident size for every loaded model.
+        """
+        return {f"{kind}:{name}": dict(stats) for (kind, name), stats in self._stats.items()}
+
+    def report(self):
+        """
+        Prints a short summary of the loaded models.
+        """
+        for key, stats in self.stats().items():
+            size = stats['resident_bytes']
+            size_text = f"{size / 1024 ** 2:.1f} MB" if size is not None else "n/a"
+            print(f"[Models] {key}: loaded in {stats['load_seconds']:.2f}s, resident {size_text}")
+
+
+# Shared by RAGSystem, Retriever and the evaluator
+registry = ModelRegistry()
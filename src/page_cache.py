@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class PageCache:
+    """
+    On-disk cache of scraped pages, addressed by the SHA-256 of the page URL.
+
+    Every entry keeps the raw HTML next to the cleaned (title, text) result, so
+    a fresh hit needs neither the network nor an HTML parser.
+    """
+    def __init__(self, cache_dir='cache/pages', ttl=7 * 24 * 3600, max_bytes=512 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + '.json', base + '.html'
+
+    def _entries(self):
+        """
+        Yields (meta_path, last_access, total_size) for every stored entry.
+        """
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                html_path = meta_path[:-len('.json')] + '.html'
+                try:
+                    size = os.path.getsize(meta_path) + os.path.getsize(html_path)
+                    yield meta_path, os.path.getmtime(meta_path), size
+                except OSError:
+                    continue
+
+    def _write(self, path, data):
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, url):
+        """
+        Returns the cached entry for url (fresh or stale), or None.
+        """
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Access time drives LRU eviction
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def put(self, url, html, title, text, etag=None, last_modified=None):
+        """
+        Stores the raw HTML and cleaned text for url, then enforces the size cap.
+        """
+        meta_path, html_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+        entry = {
+            'url': url,
+            'title': title,
+            'text': text,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time()
+        }
+        meta = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+
+        with self._lock:
+            old_size = self._size_of(meta_path, html_path)
+            self._write(html_path, html)
+            self._write(meta_path, meta)
+            self._total_bytes += len(html) + len(meta) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url, entry):
+        """
+        Marks a stale entry as fresh again after a 304 Not Modified response.
+        """
+        meta_path, _ = self._paths(url)
+        entry['fetched_at'] = time.time()
+        meta = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            old_size = self._size_of(meta_path)
+            self._write(meta_path, meta)
+            self._total_bytes += len(meta) - old_size
+
+    def _size_of(self, *paths):
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def _evict(self):
+        """
+        Removes least recently used entries until the cache fits under 90% of the cap.
+        """
+        target = self.max_bytes * 0.9
+        for meta_path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._total_bytes <= target:
+                break
+            html_path = meta_path[:-len('.json')] + '.html'
+            for path in (meta_path, html_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes -= size
+
+    def record_hit(self, seconds, revalidated=False):
+        with self._lock:
+            self.hits += 1
+            self.hit_seconds += seconds
+            if revalidated:
+                self.revalidated += 1
+
+    def record_miss(self, seconds):
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += seconds
+
+    def stats(self):
+        """
+        Returns hit/miss counters and an estimate of the scraping time saved.
+        """
+        with self._lock:
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'bytes': self._total_bytes,
+                'seconds_saved': max(0.0, avg_miss * self.hits - self.hit_seconds)
+            }
+
+    def report(self):
+        stats = self.stats()
+        print(f"[Page cache] {stats['hits']} hits ({stats['revalidated']} revalidated), "
+              f"{stats['misses']} misses, ~{stats['seconds_saved']:.1f}s of scraping saved")
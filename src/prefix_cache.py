@@ -0,0 +1,74 @@
+import copy
+
+import torch
+
+
+class PrefixCache:
+    """
+    Key/value states for the text every prompt starts with, computed once and reused by each generate().
+
+    Prompts are laid out as [prefix][padding][rest of the prompt], so the cached
+    prefix lines up in every row of a batch. generate() derives positions from the
+    attention mask, so padding in the middle is invisible to the model and greedy
+    output matches the uncached, left-padded path.
+
+    Attending to a cache needs an explicit attention mask, and on CPU that is
+    slower than the fused causal kernel an unpadded prompt gets without one, so
+    unless `cache_unpadded` is set (default: only off CPU), unpadded calls such
+    as single prompts skip the cache and only padded batches use it.
+    """
+    def __init__(self, model, tokenizer, prefix, cache_unpadded=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix = prefix
+        if cache_unpadded is None:
+            cache_unpadded = model.device.type != 'cpu'
+        self.cache_unpadded = cache_unpadded
+
+        # Leave out the last prefix token: it may merge with the text that follows it in a full prompt
+        self.prefix_ids = tokenizer(prefix)['input_ids'][:-1]
+        with torch.inference_mode():
+            ids = torch.tensor([self.prefix_ids], device=model.device)
+            self.cache = model(input_ids=ids, use_cache=True).past_key_values
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def inputs(self, prompts):
+        """
+        Returns generate() keyword arguments that reuse the cached prefix, or None when a prompt does not start with it.
+        """
+        rows = self.tokenizer(prompts)['input_ids']
+        n = len(self.prefix_ids)
+        if any(len(row) <= n or row[:n] != self.prefix_ids for row in rows):
+            self.misses += len(prompts)
+            return None
+
+        if not self.cache_unpadded and len({len(row) for row in rows}) == 1:
+            self.skipped += len(prompts)
+            return None
+        self.hits += len(prompts)
+
+        pad = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.tokenizer.eos_token_id
+        width = max(len(row) for row in rows) - n
+        input_ids, attention_mask = [], []
+        for row in rows:
+            padding = width - (len(row) - n)
+            input_ids.append(self.prefix_ids + [pad] * padding + row[n:])
+            attention_mask.append([1] * n + [0] * padding + [1] * (len(row) - n))
+
+        # generate() extends the cache in place, so every call gets its own copy
+        cache = copy.deepcopy(self.cache)
+        if len(prompts) > 1:
+            cache.batch_repeat_interleave(len(prompts))
+
+        device = self.model.device
+        return {
+            'input_ids': torch.tensor(input_ids, device=device),
+            'attention_mask': torch.tensor(attention_mask, device=device),
+            'past_key_values': cache
+        }
+
+    def stats(self):
+        return {'prefix_tokens': len(self.prefix_ids), 'hits': self.hits, 'misses': self.misses, 'skipped': self.skipped}
@@ -1,19 +1,45 @@
 import argparse
+import csv
 import os
 import time
-import pandas as pd
+from array import array
+from itertools import islice
+
+import numpy as np
 import matplotlib.pyplot as plt
-from sentence_transformers import SentenceTransformer
-import scipy.spatial.distance as distance
+from model_registry import registry
+from embedding_cache import EmbeddingCache
 
-def read_file_lines(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return [line.strip() for line in file if line.strip()]
+CSV_HEADER = ['Question', 'ChatGPT Answer', 'Model Answer', 'Semantic Similarity']
 
-def calculate_semantic_similarity(model, reference, candidate):
-    ref_embedding = model.encode(reference)
-    cand_embedding = model.encode(candidate)
-    return 1 - distance.cosine(ref_embedding, cand_embedding)
+def iter_file_lines(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line
+
+def count_file_lines(file_path):
+    return sum(1 for _ in iter_file_lines(file_path))
+
+def encode(model, texts, batch_size=256):
+    return np.asarray(model.encode(texts, batch_size=batch_size, convert_to_tensor=False, show_progress_bar=False),
+                      dtype='float32')
+
+def normalize(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def calculate_semantic_similarities(model, references, candidates, reference_cache=None):
+    """
+    Cosine similarity of every (reference, candidate) pair, from two batched encodes and one row-wise dot product.
+    """
+    if reference_cache is not None:
+        ref_embeddings = reference_cache.get(references, lambda texts: encode(model, texts))
+    else:
+        ref_embeddings = encode(model, references)
+    cand_embeddings = encode(model, candidates)
+    return np.einsum('ij,ij->i', normalize(ref_embeddings), normalize(cand_embeddings))
 
 def main():
     timestamp_ms = int(time.time() * 1000)
@@ -22,6 +48,11 @@ def main():
     parser.add_argument('--chatgpt', required=True, help='Path to ChatGPT answers file (ground truth)')
     parser.add_argument('--model', required=True, help='Path to your model answers file')
     parser.add_argument('--output', default='semantic_results.csv', help='Output file for comparison results')
+    parser.add_argument('--embedder', default='all-MiniLM-L6-v2', help='Sentence embedding model name or path')
+    parser.add_argument('--batch-size', type=int, default=1024, help='Answer pairs read, encoded and written at a time')
+    parser.add_argument('--embedding-cache', default='cache/embeddings',
+                        help='Directory where reference answer embeddings are kept between runs')
+    parser.add_argument('--no-embedding-cache', action='store_true', help='Encode reference answers on every run')
     args = parser.parse_args()
 
     base_name, extension = os.path.splitext(args.output)
@@ -34,45 +65,54 @@ def main():
             print(f"Error: File {file_path} does not exist")
             return
 
-    # Read files
-    questions = read_file_lines(args.questions)
-    chatgpt_answers = read_file_lines(args.chatgpt)
-    model_answers = read_file_lines(args.model)
-
-    if not (len(questions) == len(chatgpt_answers) == len(model_answers)):
+    # Count lines without keeping them, so the check happens before any model work
+    total = count_file_lines(args.questions)
+    if not (total == count_file_lines(args.chatgpt) == count_file_lines(args.model)):
         print("Error: All files must have the same number of lines")
         return
 
     print("Loading sentence transformer model...")
-    semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-    results = []
-
-    print(f"Comparing {len(questions)} answer pairs...")
-    for i, (question, chatgpt_answer, model_answer) in enumerate(zip(questions, chatgpt_answers, model_answers)):
-        semantic_similarity = calculate_semantic_similarity(semantic_model, chatgpt_answer, model_answer)
-
-        results.append({
-            'Question': question,
-            'ChatGPT Answer': chatgpt_answer,
-            'Model Answer': model_answer,
-            'Semantic Similarity': semantic_similarity
-        })
-
-        if (i + 1) % 10 == 0:
-            print(f"Processed {i + 1}/{len(questions)} questions")
-
-    df = pd.DataFrame(results)
-    df.to_csv(timestamped_output, index=False)
-
-    avg_semantic = df['Semantic Similarity'].mean()
+    semantic_model = registry.get_embedder(args.embedder)
+
+    # Reference answers rarely change, so their embeddings are reused across runs
+    reference_cache = None
+    if not args.no_embedding_cache:
+        reference_cache = EmbeddingCache(args.embedder, semantic_model.get_sentence_embedding_dimension(),
+                                         namespace='answers', cache_dir=args.embedding_cache)
+
+    # Only the scores are kept for the summary; rows go to the CSV one batch at a time
+    similarities = array('f')
+
+    print(f"Comparing {total} answer pairs...")
+    rows = zip(iter_file_lines(args.questions), iter_file_lines(args.chatgpt), iter_file_lines(args.model))
+    with open(timestamped_output, 'w', encoding='utf-8', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(CSV_HEADER)
+
+        while True:
+            batch = list(islice(rows, args.batch_size))
+            if not batch:
+                break
+            questions, chatgpt_answers, model_answers = zip(*batch)
+            scores = calculate_semantic_similarities(semantic_model, list(chatgpt_answers), list(model_answers),
+                                                     reference_cache)
+
+            writer.writerows(zip(questions, chatgpt_answers, model_answers, scores.tolist()))
+            f_out.flush()
+            similarities.extend(scores)
+            print(f"Processed {len(similarities)}/{total} questions")
+
+    scores = np.frombuffer(similarities, dtype='float32')
+    avg_semantic = float(scores.mean()) if len(scores) else float('nan')
     print("\nSummary:")
-    print(f"Total questions: {len(questions)}")
+    print(f"Total questions: {total}")
     print(f"Average Semantic Similarity: {avg_semantic:.4f}")
+    if reference_cache is not None:
+        reference_cache.report()
 
     # Plot histogram
     plt.figure(figsize=(10, 6))
-    plt.hist(df['Semantic Similarity'], bins=20, color='skyblue', edgecolor='black')
+    plt.hist(scores, bins=20, color='skyblue', edgecolor='black')
     plt.xlabel('Semantic Similarity')
     plt.ylabel('Number of Answers')
     plt.title('Distribution of Semantic Similarity Scores')
@@ -1,54 +1,448 @@
 import numpy as np
 import faiss
 import torch
+import os
+import queue
 import re
+import threading
+import time
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from model_registry import registry, cpu_threads, EMBEDDER_NAME, GENERATOR_NAME
+from retriever import Retriever, PROMPT_PREFIX, format_prompt
+from page_cache import PageCache
+from corpus_index import CorpusIndex
+from tracing import tracer, GenerationTimer
+from search_client import SearchClient
+from context_packer import ContextPacker
+from prefix_cache import PrefixCache
+from answer_cache import AnswerCache
+
+# The refusal the prompt asks for; streaming stops as soon as the model has said it
+UNKNOWN_ANSWER = "i don't know."
+
+
+class _TimedStreamer(TextIteratorStreamer):
+    """
+    Text streamer that also records when each new token arrives.
+    """
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True, **kwargs)
+        self.token_times = []
+        self._prompt_seen = False
+
+    def put(self, value):
+        if self._prompt_seen:
+            self.token_times.append(time.perf_counter())
+        self._prompt_seen = True
+        super().put(value)
+
+
+class _StopOnEvent(StoppingCriteria):
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
 
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from sentence_transformers import SentenceTransformer
-from retriever import Retriever
 
 class RAGSystem:
-    def __init__(self):
+    def __init__(self, batch_size=None, max_batch_size=16, corpus_dir=None, embedder_name=EMBEDDER_NAME,
+                 generator_name=GENERATOR_NAME, max_new_tokens=256, search_endpoints=None, search_fallback=None,
+                 prefilter_top_n=None, pack_context=False, context_tokens=None, drop_sentences=False,
+                 cache_prefix=True, do_sample=True, answer_cache_dir=None, answer_threshold=0.95,
+                 search_client=None, page_cache=None, backend='auto', threads=None):
+        # batch_size=None picks a batch size from free memory for every length bucket
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+
+        # Optional directory of a prebuilt CorpusIndex used before live retrieval
+        self.corpus_dir = corpus_dir
+
+        # Model names are configurable so benchmarks can swap in small models
+        self.embedder_name = embedder_name
+        self.generator_name = generator_name
+        self.max_new_tokens = max_new_tokens
+
+        # 'auto' (float16, any device), 'cpu' or 'cpu-int8' (see model_registry.BACKENDS); CPU backends
+        # use `threads` intra-op threads (default: the CPUs this process may use)
+        self.backend = backend
+        self.threads = threads
+
+        # do_sample=False decodes greedily, which makes answers reproducible (e.g. for benchmarks)
+        self.do_sample = do_sample
+
+        # Search endpoints tried in order (None uses the default searx instance), and an optional fallback backend
+        self.search_endpoints = search_endpoints
+        self.search_fallback = search_fallback
+
+        # Optional shared SearchClient and PageCache (e.g. already warmed up while the models load)
+        self.search_client = search_client
+        self.page_cache = page_cache
+
+        # Embed only this many BM25-preselected chunks per query (None embeds every chunk)
+        self.prefilter_top_n = prefilter_top_n
+
+        # Optional ContextPacker: merges same-page chunks and keeps prompts within context_tokens
+        # (default: the model's context window minus max_new_tokens)
+        self.pack_context = pack_context or bool(context_tokens) or drop_sentences
+        self.context_tokens = context_tokens
+        self.drop_sentences = drop_sentences
+        self.packer = None
+
+        # Reuse the key/value states of the fixed instruction preamble instead of prefilling it for every prompt
+        self.cache_prefix = cache_prefix
+        self.prefix_cache = None
+
+        # Optional persistent AnswerCache for repeated and paraphrased questions (None disables it)
+        self.answer_cache_dir = answer_cache_dir
+        self.answer_threshold = answer_threshold
+        self.answer_cache = None
         self.tokenizer = None
         self.generator = None
         self.emb_model = None
+        self.retriever = None
         self.index = None
         self.chunked_passages = []
 
+        # Latency of the most recent streamed answer
+        self.stream_stats = None
+
     def initialize_models(self):
-        model_name = "deepseek-ai/deepseek-llm-7b-chat"
-
-        # Load tokenizer and model with device optimization
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16,
-            device_map="auto"
-        )
+        model_name = self.generator_name
 
-        # Initialize text generation pipeline
-        self.generator = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=self.tokenizer,
-            return_full_text=False
+        # Load tokenizer and text generation pipeline once per process
+        if self.backend != 'auto':
+            cpu_threads(self.threads)
+        self.tokenizer = registry.get_tokenizer(model_name)
+        self.generator = registry.get_generator(model_name, self.backend)
+
+        if self.cache_prefix:
+            self.prefix_cache = PrefixCache(self.generator.model, self.tokenizer, PROMPT_PREFIX)
+
+        if self.pack_context:
+            window = getattr(self.generator.model.config, 'max_position_embeddings', 4096)
+            self.packer = ContextPacker(self.tokenizer, max_tokens=self.context_tokens or window - self.max_new_tokens,
+                                        drop_sentences=self.drop_sentences)
+
+        # Share the sentence embedding model with the retriever
+        self.emb_model = registry.get_embedder(self.embedder_name, self.backend)
+        self.retriever = Retriever(
+            embedder=self.emb_model,
+            page_cache=self.page_cache or PageCache(),
+            # Quantized embeddings differ slightly, so they get their own embedding cache
+            embedder_name=f"{self.embedder_name}-int8" if self.backend == 'cpu-int8' else self.embedder_name,
+            embedding_cache_dir='cache/embeddings',
+            search_client=self.search_client or SearchClient(self.search_endpoints, fallback=self.search_fallback),
+            prefilter_top_n=self.prefilter_top_n,
+            corpus_index=CorpusIndex.load(self.corpus_dir) if self.corpus_dir else None
         )
 
-        # Initialize sentence embedding model
-        self.emb_model = SentenceTransformer("all-mpnet-base-v2")
-        if torch.cuda.is_available():
-            self.emb_model = self.emb_model.to('cuda')
-
-    def generate_response_with_retriever(self, query, top_k=5):
-        retriever = Retriever()
-        
-        # Step 1: Retrieve relevant Wikipedia chunks
-        hits = retriever.retrieve_and_process(query, num_results=top_k, chunk_size=1024)
-        
-        # Step 2: Build prompt from retrieved content
-        prompt = retriever.build_prompt(hits, query)
-
-        # Step 3: Generate a response using the language model
-        output = self.generator(prompt, max_new_tokens=256, do_sample=True)[0]
-        
+        if self.answer_cache_dir:
+            self.answer_cache = AnswerCache(self.emb_model, self.embedder_name, self.generator_name, self.backend,
+                                            cache_dir=self.answer_cache_dir, threshold=self.answer_threshold)
+
+    def generate_response_with_retriever(self, query, top_k=5, generate=None):
+        """
+        Answers query end to end; generate (default: self.generate) turns a prompt into an answer.
+        """
+        with tracer.span('query', query=query):
+            # Steps 1-2: Answer from the cache, or retrieve relevant Wikipedia chunks and build the prompt
+            answer, prompt, hits = self.recall_or_retrieve(query, top_k)
+            if answer is not None:
+                return answer
+
+            # Step 3: Generate a response using the language model
+            answer = (generate or self.generate)(prompt)
+            self.remember(query, hits, answer)
+            return answer
+
+    def stream_response_with_retriever(self, query, top_k=5):
+        """
+        Like generate_response_with_retriever, but yields the answer piece by piece.
+        """
+        with tracer.span('query', query=query):
+            answer, prompt, hits = self.recall_or_retrieve(query, top_k)
+            if answer is not None:
+                yield answer
+                return
+
+            pieces = []
+            for piece in self.generate_stream(prompt):
+                pieces.append(piece)
+                yield piece
+            # Only reached when the caller read the whole answer
+            self.remember(query, hits, ''.join(pieces))
+
+    def recall_or_retrieve(self, query, top_k=5):
+        """
+        Returns (answer, None, hits) when the answer cache knows query, otherwise (None, prompt, hits).
+        """
+        # Repeated questions and close paraphrases skip retrieval entirely
+        if self.answer_cache:
+            answer = self.answer_cache.lookup(query)
+            if answer is not None:
+                return answer, None, None
+
+        hits = self.retrieve_hits(query, top_k)
+
+        # The same question over the same chunks skips generation
+        if self.answer_cache:
+            answer = self.answer_cache.get(query, hits)
+            if answer is not None:
+                return answer, None, hits
+        return None, self.retriever.build_prompt(hits, query), hits
+
+    def recall_or_retrieve_batch(self, queries, top_k=5):
+        """
+        recall_or_retrieve for many queries at once; queries the answer cache does not know share one retrieve_batch.
+        """
+        results = [None] * len(queries)
+        missing = []
+        for i, query in enumerate(queries):
+            answer = self.answer_cache.lookup(query) if self.answer_cache else None
+            if answer is not None:
+                results[i] = (answer, None, None)
+            else:
+                missing.append(i)
+
+        hits = self.retrieve_hits_batch([queries[i] for i in missing], top_k)
+        for i, query_hits in zip(missing, hits):
+            answer = self.answer_cache.get(queries[i], query_hits) if self.answer_cache else None
+            if answer is not None:
+                results[i] = (answer, None, query_hits)
+            else:
+                results[i] = (None, self.retriever.build_prompt(query_hits, queries[i]), query_hits)
+        return results
+
+    def remember(self, query, hits, answer):
+        """
+        Stores a freshly generated answer in the answer cache, if there is one.
+        """
+        if self.answer_cache and hits is not None:
+            self.answer_cache.put(query, hits, answer)
+
+    def retrieve_hits(self, query, top_k=5):
+        """
+        Returns the (packed, if enabled) hits the prompt for query is built from.
+        """
+        if self.retriever is None:
+            self.retriever = Retriever()
+        retriever = self.retriever
+
+        with tracer.span('retrieve', query=query) as span:
+            hits = retriever.retrieve_and_process(query, num_results=top_k, chunk_size=1024)
+            span.set(hits=len(hits))
+            if self.packer:
+                hits = self.packer.pack(hits, query, format_prompt)
+            return hits
+
+    def retrieve_hits_batch(self, queries, top_k=5):
+        """
+        retrieve_hits for many queries at once: pages, chunks and embeddings shared between queries are processed once.
+        """
+        if self.retriever is None:
+            self.retriever = Retriever()
+        if not queries:
+            return []
+        hits = self.retriever.retrieve_batch(queries, num_results=top_k, chunk_size=1024)
+        if self.packer:
+            hits = [self.packer.pack(query_hits, query, format_prompt)
+                    for query, query_hits in zip(queries, hits)]
+        return hits
+
+    def retrieve_prompts(self, queries, top_k=5):
+        """
+        Batched retrieval half of the pipeline: returns one prompt per query.
+        """
+        hits = self.retrieve_hits_batch(queries, top_k)
+        return [self.retriever.build_prompt(query_hits, query) for query, query_hits in zip(queries, hits)]
+
+    def generate(self, prompt):
+        """
+        Generation half of the pipeline: returns the model's answer to prompt.
+        """
+        inputs = self.prefix_cache.inputs([prompt]) if self.prefix_cache else None
+        if inputs is not None:
+            with tracer.span('generate', cached_prefix=True) as span:
+                return self._generate_inputs(inputs, self.max_new_tokens, span)[0]
+
+        if not tracer.enabled:
+            output = self.generator(prompt, max_new_tokens=self.max_new_tokens, do_sample=self.do_sample)[0]
+            return output["generated_text"].replace('\n', '')
+
+        # Time prefill and decode separately through a streamer
+        with tracer.span('generate') as span:
+            timer = GenerationTimer()
+            output = self.generator(prompt, max_new_tokens=self.max_new_tokens, do_sample=self.do_sample,
+                                    streamer=timer)[0]
+            span.set(**timer.report(tracer))
+
         return output["generated_text"].replace('\n', '')
+
+    def generate_stream(self, prompt, stop_on_unknown=True, timeout=300):
+        """
+        Yields the answer to prompt as it is decoded, recording time to first token and inter-token latency.
+
+        With stop_on_unknown, generation ends right after the model answers "I don't know." Errors
+        raised by generation are re-raised here, and waiting more than `timeout` seconds for the
+        next piece raises TimeoutError.
+        """
+        start = time.perf_counter()
+        tokenizer = self.tokenizer
+        model = self.generator.model
+
+        # Generation runs on its own thread and hands decoded text over through the streamer
+        streamer = _TimedStreamer(tokenizer, timeout=timeout)
+        stop = threading.Event()
+        error = []
+        inputs = self.prefix_cache.inputs([prompt]) if self.prefix_cache else None
+        if inputs is None:
+            inputs = tokenizer(prompt, return_tensors='pt').to(model.device)
+
+        def run():
+            try:
+                with torch.inference_mode():
+                    model.generate(
+                        **inputs,
+                        max_new_tokens=self.max_new_tokens,
+                        do_sample=self.do_sample,
+                        pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None
+                        else tokenizer.eos_token_id,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)])
+                    )
+            except Exception as e:
+                error.append(e)
+            finally:
+                # Ends the consumer's loop even when generate failed before or while streaming
+                streamer.end()
+
+        thread = threading.Thread(target=run, name='generate-stream', daemon=True)
+        thread.start()
+
+        text = ''
+        stopped_early = False
+        with tracer.span('generate_stream') as span:
+            try:
+                for piece in streamer:
+                    piece = piece.replace('\n', '')
+                    if not piece:
+                        continue
+                    text += piece
+                    yield piece
+
+                    if stop_on_unknown and UNKNOWN_ANSWER in text.replace('’', "'").casefold():
+                        stopped_early = True
+                        break
+            except queue.Empty:
+                raise TimeoutError(f"No generated text for {timeout}s") from None
+            finally:
+                # Also stops the model when the caller abandons the generator
+                stop.set()
+                thread.join()
+
+                times = streamer.token_times
+                gaps = np.diff(times) * 1000 if len(times) > 1 else np.array([])
+                self.stream_stats = {
+                    'tokens': len(times),
+                    'ttft_ms': round((times[0] - start) * 1000, 1) if times else None,
+                    'mean_itl_ms': round(float(gaps.mean()), 2) if len(gaps) else None,
+                    'p90_itl_ms': round(float(np.percentile(gaps, 90)), 2) if len(gaps) else None,
+                    'stopped_early': stopped_early
+                }
+                span.set(**self.stream_stats)
+                tracer.count('generated_tokens_total', len(times))
+            if error:
+                raise error[0]
+
+    def report_stream(self):
+        stats = self.stream_stats
+        if not stats or stats['ttft_ms'] is None:
+            return
+        itl = f", {stats['mean_itl_ms']:.1f} ms between tokens (p90 {stats['p90_itl_ms']:.1f})" \
+            if stats['mean_itl_ms'] is not None else ""
+        stop = ", stopped at \"I don't know.\"" if stats['stopped_early'] else ""
+        print(f"[Stream] {stats['tokens']} tokens, first after {stats['ttft_ms']:.0f} ms{itl}{stop}")
+
+    def generate_batch(self, prompts, batch_size=None, max_new_tokens=None):
+        """
+        Generates answers for many prompts at once and returns them in input order.
+        """
+        if not prompts:
+            return []
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        tokenizer = self.tokenizer
+        model = self.generator.model
+
+        # Decoder-only models need left padding; the deepseek tokenizer ships without a pad token
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = 'left'
+
+        # Bucket prompts by tokenized length so each batch carries little padding
+        lengths = [len(ids) for ids in tokenizer(prompts)['input_ids']]
+        order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+
+        answers = [None] * len(prompts)
+        start = 0
+        while start < len(order):
+            size = batch_size or self.batch_size
+            if size is None:
+                # Size against the longest prompt this bucket could hold
+                longest = lengths[order[min(len(order), start + self.max_batch_size) - 1]]
+                size = self.choose_batch_size(longest + max_new_tokens)
+            bucket = order[start:start + size]
+            start += size
+
+            bucket_prompts = [prompts[i] for i in bucket]
+            inputs = self.prefix_cache.inputs(bucket_prompts) if self.prefix_cache else None
+            with tracer.span('generate_batch', batch=len(bucket), cached_prefix=inputs is not None) as span:
+                if inputs is None:
+                    inputs = tokenizer(bucket_prompts, return_tensors='pt', padding=True).to(model.device)
+                for i, text in zip(bucket, self._generate_inputs(inputs, max_new_tokens, span)):
+                    answers[i] = text
+
+        return answers
+
+    def _generate_inputs(self, inputs, max_new_tokens, span):
+        """
+        Runs model.generate on tokenized inputs and returns the decoded answers.
+        """
+        tokenizer = self.tokenizer
+        with torch.inference_mode():
+            timer = GenerationTimer() if tracer.enabled else None
+            outputs = self.generator.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=self.do_sample,
+                pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+                streamer=timer
+            )
+            if timer:
+                span.set(**timer.report(tracer))
+
+        # Keep only the newly generated tokens, as the pipeline does with return_full_text=False
+        new_tokens = outputs[:, inputs['input_ids'].shape[1]:]
+        return [text.replace('\n', '') for text in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+    def choose_batch_size(self, seq_len):
+        """
+        Estimates how many sequences of seq_len tokens fit in half of the free memory.
+        """
+        config = self.generator.model.config
+        layers = config.num_hidden_layers
+        heads = config.num_attention_heads
+        kv_heads = getattr(config, 'num_key_value_heads', None) or heads
+        head_dim = config.hidden_size // heads
+        dtype_bytes = torch.finfo(self.generator.model.dtype).bits // 8
+
+        # Keys and values for every layer dominate per-sequence memory during decoding
+        per_sequence = 2 * layers * kv_heads * head_dim * seq_len * dtype_bytes
+
+        if torch.cuda.is_available():
+            free_bytes, _ = torch.cuda.mem_get_info()
+        else:
+            free_bytes = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+        return max(1, min(self.max_batch_size, int(free_bytes * 0.5 // per_sequence)))
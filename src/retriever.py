@@ -1,89 +1,182 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from concurrent.futures import Future, ThreadPoolExecutor
 from wiki_scraper import WikiScraper
 import faiss
-from sentence_transformers import SentenceTransformer
-import torch
 import numpy as np
-import requests
+from model_registry import registry, EMBEDDER_NAME
+from embedding_cache import EmbeddingCache
+from chunker import TextChunker, token_length_function
+from tracing import tracer
+from search_client import SearchClient, SEARCH_URL
+from lexical import BM25
+
+PROMPT_INSTRUCTIONS = "You are an expert assistant. Use only the information provided below to answer the user’s question. Do not make up any facts; if the answer is not contained in the context, respond with “I don’t know.”"
+
+# Text every prompt from build_prompt starts with; RAGSystem caches its key/value states once
+PROMPT_PREFIX = f"{PROMPT_INSTRUCTIONS}\n\nContext:\n"
+
+
+def format_prompt(hits, query):
+    """
+    Prompt text for hits and query; untraced, so candidate prompts (e.g. while packing) aren't counted as prompt builds.
+    """
+    prompt = [
+        PROMPT_INSTRUCTIONS,
+        "",
+        "Context:"
+    ]
+    for i, (title, chunk, _) in enumerate(hits, start=1):
+        prompt.append(f"[Source {i}: {title}]")
+        prompt.append(chunk)
+        prompt.append("")  # Blank line
+
+    prompt.append("Question:")
+    prompt.append(query)
+    prompt.append("")
+    prompt.append("Answer:")
+
+    return "\n".join(prompt)
+
 
 class Retriever:
-    def __init__(self):
-        # Initialize the Wikipedia scraper and sentence embedding model
-        self.wiki_scraper = WikiScraper()
-        self.embedder = SentenceTransformer("all-mpnet-base-v2")
-        
-        # Move embedder to GPU if available
-        if torch.cuda.is_available():
-            self.embedder = self.embedder.to('cuda')
+    def __init__(self, embedder=None, page_cache=None, embedder_name=EMBEDDER_NAME, embedding_cache_dir=None,
+                 corpus_index=None, min_similarity=0.6, chunk_tokens=False, search_url=SEARCH_URL,
+                 search_client=None, prefilter_top_n=None, lexical_weight=0.3):
+        # Initialize the Wikipedia scraper and the shared sentence embedding model
+        self.wiki_scraper = WikiScraper(cache=page_cache)
+        self.search_client = search_client if search_client is not None else SearchClient([search_url])
+        self.embedder_name = embedder_name
+        self.embedder = embedder if embedder is not None else registry.get_embedder(embedder_name)
+
+        # Chunkers per (chunk_size, chunk_overlap); with chunk_tokens sizes are embedder tokens, not characters
+        self.chunk_tokens = chunk_tokens
+        self.chunkers = {}
+
+        # Chunk embedding caches, one per (chunk_size, chunk_overlap) setting
+        self.embedding_cache_dir = embedding_cache_dir
+        self.embedding_caches = {}
+
+        # Optional BM25 prefilter: only the prefilter_top_n best lexical matches are embedded and
+        # ranked by a blend of cosine similarity and normalized BM25 score
+        self.prefilter_top_n = prefilter_top_n
+        self.lexical_weight = lexical_weight
+
+        # Optional prebuilt CorpusIndex; live retrieval is only used when its best match is weak
+        self.corpus_index = corpus_index
+        self.min_similarity = min_similarity
 
     def retrieve_wikipedia_links(self, query, num_results=5):
         """
         Retrieves Wikipedia links related to the given query using a searxNG search engine.
         """
-        base_url = 'http://207.154.241.192:8080/search'
-        params = {
-            'q': query + " site:wikipedia.org",
-            'format': 'json',
-            'pageno': 1,
-            'categories': 'general',
-            'language': 'en',
-            'safesearch': 0,
-            'engines': 'google,bing,duckduckgo,brave',
-            'max_results': num_results
-        }
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'http://207.154.241.192:8080/',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        # Make the request and handle errors
-        try:
-            response = requests.get(base_url, params=params, headers=headers, timeout=30)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print(f"HTTP Error: {e}")
-            print(f"Response status: {response.status_code}")
-            print(f"Response text: {response.text}")
-            return []
+        with tracer.span('search', query=query) as span:
+            wiki_links = self.search_client.search(query, num_results)
+            span.set(links=len(wiki_links))
+        return wiki_links
 
-        # Extract Wikipedia links
-        results = response.json().get('results', [])
-        wiki_links = [res['url'] for res in results if 'wikipedia.org' in res.get('url', '')]
-        
-        return wiki_links[:num_results]
+    def report(self):
+        """
+        Prints cache statistics for the retrieval pipeline.
+        """
+        self.search_client.report()
+        if self.wiki_scraper.cache:
+            self.wiki_scraper.cache.report()
+        for cache in self.embedding_caches.values():
+            cache.report()
 
-    def scrape_wikipedia_pages(self, wiki_links):
+    def scrape_wikipedia_pages(self, wiki_links, max_workers=None):
         """
-        Scrapes Wikipedia pages and returns a list of (title, text) tuples.
+        Scrapes Wikipedia pages concurrently and returns a list of (title, text) tuples in link order.
         """
-        results = []
-        for link in wiki_links:
-            try:
-                title, text = self.wiki_scraper.scrape_page(link)
-                results.append((title, text))
-            except Exception as e:
-                print(f"Error scraping {link}: {e}")
+        return [page for page in self.scrape_pages_by_link(wiki_links, max_workers) if page is not None]
+
+    def scrape_pages_by_link(self, wiki_links, max_workers=None):
+        """
+        Like scrape_wikipedia_pages, but returns one entry per link, None where scraping failed.
+        """
+        if max_workers == 1 or len(wiki_links) <= 1:
+            results = []
+            for link in wiki_links:
+                try:
+                    title, text = self.wiki_scraper.scrape_page(link)
+                    results.append((title, text))
+                except Exception as e:
+                    print(f"Error scraping {link}: {e}")
+                    results.append(None)
+            return results
+
+        io_workers = max_workers or len(wiki_links)
+        parse_workers = min(4, len(wiki_links))
+        with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+             ThreadPoolExecutor(max_workers=parse_workers) as parse_pool:
+
+            def fetch(link):
+                # Hand the download to the parse pool so slow pages don't hold up other fetches
+                page = self.wiki_scraper.fetch_page(link)
+                if isinstance(page, tuple):
+                    return page
+                return parse_pool.submit(tracer.wrap(self.wiki_scraper.process_response), link, page)
+
+            fetches = [io_pool.submit(tracer.wrap(fetch), link) for link in wiki_links]
+
+            # Collect in the original rank order
+            results = []
+            for link, future in zip(wiki_links, fetches):
+                try:
+                    page = future.result()
+                    if isinstance(page, Future):
+                        page = page.result()
+                    results.append(page)
+                except Exception as e:
+                    print(f"Error scraping {link}: {e}")
+                    results.append(None)
         return results
 
+    def get_chunker(self, chunk_size, chunk_overlap):
+        """
+        Returns the chunker for the given setting, sized in characters or embedder tokens.
+        """
+        key = (chunk_size, chunk_overlap)
+        if key not in self.chunkers:
+            if self.chunk_tokens:
+                # Keep every chunk inside the embedder's window, leaving room for the special tokens
+                window = self.embedder.max_seq_length - 2
+                size = min(chunk_size, window)
+                self.chunkers[key] = TextChunker(size, min(chunk_overlap, size // 2),
+                                                 length_function=token_length_function(self.embedder.tokenizer))
+            else:
+                self.chunkers[key] = TextChunker(chunk_size, chunk_overlap)
+        return self.chunkers[key]
+
+    def split_text_into_offsets(self, text, chunk_size=500, chunk_overlap=200):
+        """
+        Returns (start, end) offsets of overlapping chunks of text.
+        """
+        with tracer.span('chunk', chars=len(text)) as span:
+            offsets = []
+            for start, end in self.get_chunker(chunk_size, chunk_overlap).split_offsets(text):
+                # Chunks should not start with leftover punctuation from the previous split
+                while start < end and text[start] in " .,!?\n":
+                    start += 1
+                offsets.append((start, end))
+            span.set(chunks=len(offsets))
+        return offsets
+
     def split_text_into_chunks(self, text, chunk_size=500, chunk_overlap=200):
         """
         Splits long text into manageable overlapping chunks.
         """
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-        )
-        chunks = splitter.create_documents([text])
-        return [chunk.page_content.lstrip(" .,!?\n") for chunk in chunks]
+        return [text[start:end] for start, end in self.split_text_into_offsets(text, chunk_size, chunk_overlap)]
 
     def retrieve_and_process(self, query, num_results=2, chunk_size=500, chunk_overlap=200):
         """
         Full retrieval and processing pipeline: fetch links, scrape text, chunk, embed, search.
         """
+        # Step 0: Answer from the offline corpus when it has a confident match
+        if self.corpus_index is not None:
+            hits = self.search_corpus(query)
+            if hits:
+                return hits
+
         # Step 1: Retrieve Wikipedia links
         wiki_links = self.retrieve_wikipedia_links(query, num_results)
         if not wiki_links:
@@ -107,66 +200,244 @@ class Retriever:
             print("No text chunks generated.")
             return []
 
+        # Steps 4-5: Embed and rank the chunks
+        return self.rank_chunks(query, processed_chunks, chunk_size, chunk_overlap)
+
+    def rank_chunks(self, query, chunks, chunk_size=None, chunk_overlap=None, top_k=5):
+        """
+        Embeds (title, chunk_text) pairs and returns the top_k hits for query.
+        """
+        if self.prefilter_top_n and len(chunks) > self.prefilter_top_n:
+            return self.rank_chunks_hybrid(query, chunks, chunk_size, chunk_overlap, top_k)
+
         # Step 4: Embed text chunks
-        embeddings, metadata = self.embed_chunks(processed_chunks)
+        embeddings, metadata = self.embed_chunks(chunks, chunk_size, chunk_overlap)
         if embeddings.shape[0] == 0:
             print("Embedding failed or returned empty array.")
             return []
 
         # Step 5: Create FAISS index and search
         index = self.build_faiss_index(embeddings)
-        hits = self.search_chunk(index, metadata, query)
+        hits = self.search_chunk(index, metadata, query, top_k)
 
         return hits
 
-    def embed_chunks(self, chunks):
+    def rank_chunks_hybrid(self, query, chunks, chunk_size=None, chunk_overlap=None, top_k=5):
+        """
+        Embeds only the best BM25 matches and ranks them by a blend of dense and lexical scores.
+        """
+        # Step 4a: Keep the prefilter_top_n best lexical matches
+        candidates, lexical = self.prefilter_chunks(query, chunks)
+
+        # Step 4b: Embed the survivors
+        embeddings, metadata = self.embed_chunks(candidates, chunk_size, chunk_overlap)
+        if embeddings.shape[0] == 0:
+            print("Embedding failed or returned empty array.")
+            return []
+
+        # Step 5: Score every candidate; there are few enough that no index is needed
+        with tracer.span('search_chunk', top_k=top_k):
+            q_emb = self.embedder.encode([query], convert_to_tensor=False)
+            return self.hybrid_hits(q_emb, embeddings, metadata, lexical, top_k)
+
+    def prefilter_chunks(self, query, chunks):
+        """
+        Returns the prefilter_top_n best BM25 matches in their original order, with their scores.
+        """
+        with tracer.span('prefilter', chunks=len(chunks), keep=self.prefilter_top_n):
+            lexical = BM25([text for _, text in chunks]).scores(query)
+            keep = np.sort(np.argsort(-lexical, kind='stable')[:self.prefilter_top_n])
+            return [chunks[i] for i in keep], lexical[keep]
+
+    def hybrid_hits(self, q_emb, embeddings, metadata, lexical, top_k=5):
+        """
+        Ranks candidates by (1 - lexical_weight) * cosine + lexical_weight * max-normalized BM25.
+        """
+        q_emb = np.array(q_emb, dtype='float32').reshape(1, -1)
+        embeddings = np.array(embeddings, dtype='float32')
+        faiss.normalize_L2(q_emb)
+        faiss.normalize_L2(embeddings)
+        dense = embeddings @ q_emb[0]
+
+        if lexical.max() > 0:
+            lexical = lexical / lexical.max()
+        scores = (1 - self.lexical_weight) * dense + self.lexical_weight * lexical
+        order = np.argsort(-scores, kind='stable')[:top_k]
+
+        # Lower is better, as with the L2 distances of the exhaustive path
+        return [(metadata[i][0], metadata[i][1], float(1 - scores[i])) for i in order]
+
+    def retrieve_batch(self, queries, num_results=2, chunk_size=500, chunk_overlap=200, top_k=5):
+        """
+        retrieve_and_process for many queries at once, returning one hit list per query.
+
+        All queries are encoded in one call, each distinct URL is scraped and chunked
+        once, each distinct chunk is embedded once, and a single multi-query FAISS
+        search over the union ranks every query's own chunks.
+        """
+        with tracer.span('retrieve_batch', queries=len(queries)):
+            results = [[] for _ in queries]
+            if not queries:
+                return results
+
+            # Step 0: Encode every query at once
+            q_embs = np.array(self.embedder.encode(list(queries), convert_to_tensor=False), dtype='float32')
+
+            # Step 1: Answer confident queries from the offline corpus
+            live = list(range(len(queries)))
+            if self.corpus_index is not None:
+                live = []
+                for i, hits in enumerate(self.corpus_index.search(q_embs, top_k)):
+                    hits = self.confident_corpus_hits(hits)
+                    if hits:
+                        results[i] = hits
+                    else:
+                        live.append(i)
+            if not live:
+                return results
+
+            # Step 2: Search for every remaining query concurrently
+            with ThreadPoolExecutor(max_workers=min(8, len(live))) as pool:
+                links = list(pool.map(tracer.wrap(lambda i: self.retrieve_wikipedia_links(queries[i], num_results)),
+                                      live))
+
+            # Step 3: Scrape and chunk each distinct page once
+            unique_links = list(dict.fromkeys(link for query_links in links for link in query_links))
+            page_chunks = {}
+            pages = self.scrape_pages_by_link(unique_links, max_workers=min(16, len(unique_links)) or None)
+            for link, page in zip(unique_links, pages):
+                if page is not None:
+                    title, text = page
+                    page_chunks[link] = [(title, chunk) for chunk in
+                                         self.split_text_into_chunks(text, chunk_size, chunk_overlap)]
+
+            # Each query keeps its own chunk list, in the order the per-query path would build it
+            candidates, lexical = {}, {}
+            for i, query_links in zip(live, links):
+                chunks = [chunk for link in query_links for chunk in page_chunks.get(link, [])]
+                if self.prefilter_top_n and len(chunks) > self.prefilter_top_n:
+                    chunks, lexical[i] = self.prefilter_chunks(queries[i], chunks)
+                if chunks:
+                    candidates[i] = chunks
+            if not candidates:
+                return results
+
+            # Step 4: Embed each distinct chunk text once
+            rows = {}
+            for chunks in candidates.values():
+                for _, text in chunks:
+                    rows.setdefault(text, len(rows))
+            embeddings, _ = self.embed_chunks([(None, text) for text in rows], chunk_size, chunk_overlap)
+            embeddings = np.array(embeddings, dtype='float32')
+
+            # Step 5: One search of every exhaustive query against the whole union gives each
+            # query's distance to every row; each query then ranks only its own chunks
+            exhaustive = [i for i in candidates if i not in lexical]
+            if exhaustive:
+                index = self.build_faiss_index(embeddings)
+                with tracer.span('search_chunk', top_k=top_k, queries=len(exhaustive)):
+                    distances, indices = index.search(q_embs[exhaustive], index.ntotal)
+                for i, row_distances, row_indices in zip(exhaustive, distances, indices):
+                    by_row = np.empty(index.ntotal, dtype='float32')
+                    by_row[row_indices] = row_distances
+                    chunk_distances = by_row[[rows[text] for _, text in candidates[i]]]
+                    order = np.argsort(chunk_distances, kind='stable')[:top_k]
+                    results[i] = [(*candidates[i][j], float(chunk_distances[j])) for j in order]
+
+            for i in lexical:
+                chunk_rows = [rows[text] for _, text in candidates[i]]
+                results[i] = self.hybrid_hits(q_embs[i], embeddings[chunk_rows], candidates[i], lexical[i], top_k)
+
+        return results
+
+    def search_corpus(self, query, top_k=5):
+        """
+        Searches the prebuilt corpus index, returning None when the best hit is below min_similarity.
+        """
+        with tracer.span('search_corpus', top_k=top_k) as span:
+            q_emb = self.embedder.encode([query], convert_to_tensor=False)
+            hits = self.corpus_index.search(q_emb, top_k)[0]
+            span.set(best=hits[0][2] if hits else None)
+        return self.confident_corpus_hits(hits)
+
+    def confident_corpus_hits(self, hits):
+        """
+        Returns corpus hits as live-path hits, or None when the best one is below min_similarity.
+        """
+        if not hits or hits[0][2] < self.min_similarity:
+            return None
+
+        # Report squared L2 distance between unit vectors, matching the live path's ordering
+        return [(title, chunk, 2.0 - 2.0 * score) for title, chunk, score in hits]
+
+    def embed_chunks(self, chunks, chunk_size=None, chunk_overlap=None):
         """
         Converts list of (title, chunk_text) into sentence embeddings.
         """
         texts = [chunk_text for _, chunk_text in chunks]
-        embs = self.embedder.encode(texts, convert_to_tensor=False, show_progress_bar=True)
-        return np.array(embs, dtype='float32'), chunks
+
+        with tracer.span('embed', chunks=len(texts)) as span:
+            cache = self.get_embedding_cache(chunk_size, chunk_overlap)
+            if cache is None:
+                embs = self.embedder.encode(texts, convert_to_tensor=False, show_progress_bar=not tracer.enabled)
+                return np.array(embs, dtype='float32'), chunks
+
+            def encode(missing):
+                # Only chunks the cache has not seen are sent through the embedder
+                span.set(encoded=len(missing))
+                return self.embedder.encode(missing, convert_to_tensor=False, show_progress_bar=not tracer.enabled)
+
+            embs = cache.get(texts, encode)
+        return embs, chunks
+
+    def get_embedding_cache(self, chunk_size, chunk_overlap):
+        """
+        Returns the embedding cache for the given chunking setting, or None when caching is off.
+        """
+        if self.embedding_cache_dir is None:
+            return None
+        key = (chunk_size, chunk_overlap)
+        if key not in self.embedding_caches:
+            self.embedding_caches[key] = EmbeddingCache(
+                self.embedder_name,
+                self.embedder.get_sentence_embedding_dimension(),
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                cache_dir=self.embedding_cache_dir
+            )
+        return self.embedding_caches[key]
 
     def build_faiss_index(self, embeddings):
         """
         Builds a FAISS index from the embeddings for similarity search.
         """
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dim)
-        index.add(embeddings)
+        with tracer.span('index_build', vectors=embeddings.shape[0]):
+            dim = embeddings.shape[1]
+            index = faiss.IndexFlatL2(dim)
+            index.add(embeddings)
         return index
 
     def search_chunk(self, index, metadata, query, top_k=5):
         """
         Searches for top_k most similar chunks to the query using FAISS index.
         """
-        q_emb = self.embedder.encode([query], convert_to_tensor=False)
-        q_emb = np.array(q_emb, dtype='float32')
-        distances, indices = index.search(q_emb, top_k)
+        with tracer.span('search_chunk', top_k=top_k):
+            q_emb = self.embedder.encode([query], convert_to_tensor=False)
+            q_emb = np.array(q_emb, dtype='float32')
+            distances, indices = index.search(q_emb, top_k)
 
-        hits = []
-        for dist, idx in zip(distances[0], indices[0]):
-            title, chunk_text = metadata[idx]
-            hits.append((title, chunk_text, float(dist)))
+            hits = []
+            for dist, idx in zip(distances[0], indices[0]):
+                # FAISS pads with -1 when there are fewer than top_k chunks
+                if idx < 0:
+                    continue
+                title, chunk_text = metadata[idx]
+                hits.append((title, chunk_text, float(dist)))
         return hits
 
     def build_prompt(self, hits, query):
         """
         Builds a final prompt for the language model from search hits and a user query.
         """
-        prompt = [
-            "You are an expert assistant. Use only the information provided below to answer the user’s question. Do not make up any facts; if the answer is not contained in the context, respond with “I don’t know.”",
-            "",
-            "Context:"
-        ]
-        for i, (title, chunk, _) in enumerate(hits, start=1):
-            prompt.append(f"[Source {i}: {title}]")
-            prompt.append(chunk)
-            prompt.append("")  # Blank line
-
-        prompt.append("Question:")
-        prompt.append(query)
-        prompt.append("")
-        prompt.append("Answer:")
-        
-        return "\n".join(prompt)
+        with tracer.span('prompt_build', hits=len(hits)):
+            return format_prompt(hits, query)
@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SEARCH_URL = 'http://207.154.241.192:8080/search'
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query):
+    """
+    Folds case, unicode forms, punctuation and whitespace so near-identical questions share a cache entry.
+    """
+    query = unicodedata.normalize('NFKC', query).casefold()
+    return ' '.join(PUNCTUATION.sub(' ', query).split())
+
+
+class SearchClient:
+    """
+    Cached, resilient client for one or more searx instances.
+
+    Results are cached per normalized query for `ttl` seconds; queries that
+    returned no links are cached for `negative_ttl`. Requests reuse pooled
+    connections and retry transient HTTP failures. Endpoints are tried in
+    order: when the current one has not answered after `hedge_after` seconds
+    the next one is queried as well and the first answer wins, and a failing
+    endpoint hands over to the next immediately. If every endpoint fails, the
+    optional `fallback` (any object with a `search(query, num_results)` method
+    returning links) is asked instead.
+    """
+    def __init__(self, endpoints=None, fallback=None, ttl=24 * 3600, negative_ttl=300, max_entries=10000,
+                 timeout=10, retries=2, backoff=0.3, hedge_after=1.0):
+        self.endpoints = list(endpoints or [SEARCH_URL])
+        self.fallback = fallback
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+
+        # LRU of normalized query -> (expires_at, links)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2 * len(self.endpoints), thread_name_prefix='search')
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+            'Accept': 'application/json',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'X-Requested-With': 'XMLHttpRequest'
+        })
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET'])
+        )
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=8, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.hedges = 0
+        self.errors = 0
+        self.fallbacks = 0
+
+    def search(self, query, num_results=5):
+        """
+        Returns up to num_results Wikipedia links for query, from the cache when possible.
+        """
+        key = (normalize_query(query), num_results)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > now:
+                self._cache.move_to_end(key)
+                if entry[1]:
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        links = self._query_endpoints(query, num_results)
+        if links is None and self.fallback is not None:
+            with self._lock:
+                self.fallbacks += 1
+            try:
+                if isinstance(self.fallback, SearchClient):
+                    # Its search() reports failure as [], which would be cached here as "no results"
+                    links = self.fallback._query_endpoints(query, num_results)
+                else:
+                    links = self.fallback.search(query, num_results)
+            except Exception as e:
+                print(f"Fallback search failed: {e}")
+
+        # Errors are not cached, so the next call tries the endpoints again
+        if links is None:
+            return []
+        self._store(key, links)
+        return list(links)
+
+    def _store(self, key, links):
+        ttl = self.ttl if links else self.negative_ttl
+        with self._lock:
+            self._cache[key] = (time.time() + ttl, links)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _query_endpoints(self, query, num_results):
+        """
+        Asks the endpoints with hedging and failover; returns None when all of them fail.
+        """
+        pending = {}
+        next_endpoint = 0
+
+        def launch():
+            nonlocal next_endpoint
+            endpoint = self.endpoints[next_endpoint]
+            next_endpoint += 1
+            pending[self._pool.submit(self._request, endpoint, query, num_results)] = endpoint
+
+        launch()
+        while pending:
+            # Only wait for the hedge delay while there is another endpoint left to try
+            timeout = self.hedge_after if next_endpoint < len(self.endpoints) else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                with self._lock:
+                    self.hedges += 1
+                launch()
+                continue
+
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    return future.result()
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    with self._lock:
+                        self.errors += 1
+                    print(f"Search error from {endpoint}: {e}")
+                    if next_endpoint < len(self.endpoints):
+                        launch()
+        return None
+
+    def _request(self, endpoint, query, num_results):
+        params = {
+            'q': query + " site:wikipedia.org",
+            'format': 'json',
+            'pageno': 1,
+            'categories': 'general',
+            'language': 'en',
+            'safesearch': 0,
+            'engines': 'google,bing,duckduckgo,brave',
+            'max_results': num_results
+        }
+        response = self.session.get(endpoint, params=params, headers={'Referer': urljoin(endpoint, '/')},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+
+        # A malformed body (e.g. from a misconfigured proxy) counts as an endpoint failure, so the next one is asked
+        body = response.json()
+        results = body.get('results', []) if isinstance(body, dict) else None
+        if not isinstance(results, list) or not all(isinstance(res, dict) and isinstance(res.get('url'), str)
+                                                    for res in results):
+            raise ValueError("Malformed search response")
+
+        # Extract Wikipedia links
+        wiki_links = [res['url'] for res in results if 'wikipedia.org' in res['url']]
+        return wiki_links[:num_results]
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hedged_requests': self.hedges,
+            'errors': self.errors,
+            'fallbacks': self.fallbacks,
+            'entries': len(self._cache)
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(f"[Search] {stats['hits']} hits, {stats['negative_hits']} negative hits, {stats['misses']} misses, "
+              f"{stats['hedged_requests']} hedged requests, {stats['errors']} errors, {stats['fallbacks']} fallbacks")
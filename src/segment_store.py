@@ -0,0 +1,255 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class SegmentStore:
+    """
+    Append-only store for chunk vectors and metadata, grouped into segments.
+
+    Pages are appended to the active segment (`seg-NNNNNN.vec` holds raw float32
+    rows, `seg-NNNNNN.jsonl` one metadata line per row) and their URL to
+    `urls.log`. A checkpoint flushes everything and atomically rewrites the small
+    `manifest.json` with the byte length of every file. On open, anything written
+    after the last checkpoint is truncated away, so an interrupted ingestion
+    resumes from the last checkpoint by URL. Compaction writes a fresh store next
+    to this one and swaps the directories.
+    """
+    MANIFEST_FILE = 'manifest.json'
+    URLS_FILE = 'urls.log'
+
+    def __init__(self, path, dim, segment_rows=100_000, checkpoint_every=500):
+        self.path = path
+        self.dim = dim
+        self.segment_rows = segment_rows
+        self.checkpoint_every = checkpoint_every
+        self._finish_compaction()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _finish_compaction(self):
+        """
+        Completes or discards a compaction that was interrupted mid-swap.
+        """
+        compact_path, old_path = self.path + '.compact', self.path + '.old'
+        if not os.path.exists(self.path) and os.path.exists(old_path) and os.path.exists(compact_path):
+            os.replace(compact_path, self.path)
+        shutil.rmtree(compact_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def _load(self):
+        self.segments = []
+        self.urls_bytes = 0
+        self._pages_since_checkpoint = 0
+        self._handles = None
+
+        manifest_path = self._file(self.MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest['dim'] != self.dim:
+                raise ValueError(f"Segment store at {self.path} has dimension {manifest['dim']}, not {self.dim}")
+            self.segments = manifest['segments']
+            self.urls_bytes = manifest['urls_bytes']
+        self._recover()
+
+        self.done_urls = set()
+        with open(self._file(self.URLS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                self.done_urls.add(line.rstrip('\n'))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _recover(self):
+        """
+        Truncates every file to its checkpointed length and removes unknown segments.
+        """
+        known = {self.URLS_FILE, self.MANIFEST_FILE}
+        for segment in self.segments:
+            for suffix, size_key in (('.vec', 'vec_bytes'), ('.jsonl', 'meta_bytes')):
+                name = segment['name'] + suffix
+                known.add(name)
+                with open(self._file(name), 'ab') as f:
+                    f.truncate(segment[size_key])
+
+        with open(self._file(self.URLS_FILE), 'ab') as f:
+            f.truncate(self.urls_bytes)
+
+        for name in os.listdir(self.path):
+            if name not in known:
+                os.remove(self._file(name))
+
+    def _open_active(self):
+        """
+        Opens append handles on the active segment, starting a new one when it is full.
+        """
+        if not self.segments or self.segments[-1]['rows'] >= self.segment_rows:
+            self._close_handles()
+            self.segments.append({'name': f"seg-{len(self.segments) + 1:06d}", 'rows': 0,
+                                  'vec_bytes': 0, 'meta_bytes': 0})
+        if self._handles is None:
+            name = self.segments[-1]['name']
+            self._handles = (
+                open(self._file(name + '.vec'), 'ab'),
+                open(self._file(name + '.jsonl'), 'ab'),
+                open(self._file(self.URLS_FILE), 'ab')
+            )
+        return self._handles
+
+    def _close_handles(self):
+        if self._handles is not None:
+            for handle in self._handles:
+                handle.close()
+            self._handles = None
+
+    def is_done(self, url):
+        return url in self.done_urls
+
+    def add_page(self, url, entries, vectors):
+        """
+        Appends one page's chunk metadata and vectors, then marks the URL as done.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype='float32').reshape(-1, self.dim)
+        if len(entries) != vectors.shape[0]:
+            raise ValueError("Each chunk entry needs exactly one vector")
+
+        vec_file, meta_file, urls_file = self._open_active()
+        segment = self.segments[-1]
+
+        vec_data = vectors.tobytes()
+        meta_data = b''.join(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n' for entry in entries)
+        url_data = url.encode('utf-8') + b'\n'
+        vec_file.write(vec_data)
+        meta_file.write(meta_data)
+        urls_file.write(url_data)
+
+        segment['rows'] += vectors.shape[0]
+        segment['vec_bytes'] += len(vec_data)
+        segment['meta_bytes'] += len(meta_data)
+        self.urls_bytes += len(url_data)
+        self.done_urls.add(url)
+
+        self._pages_since_checkpoint += 1
+        if self._pages_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Makes everything appended so far durable by syncing data and swapping in a new manifest.
+        """
+        if self._handles is not None:
+            for handle in self._handles:
+                handle.flush()
+                os.fsync(handle.fileno())
+
+        manifest = {'dim': self.dim, 'segments': self.segments, 'urls_bytes': self.urls_bytes}
+        tmp_path = self._file(self.MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(self.MANIFEST_FILE))
+        self._pages_since_checkpoint = 0
+
+    def close(self):
+        self.checkpoint()
+        self._close_handles()
+
+    @property
+    def rows(self):
+        return sum(segment['rows'] for segment in self.segments)
+
+    def iter_segments(self):
+        """
+        Yields (vectors, metadata) per segment; vectors are memory-mapped float32 rows.
+        """
+        for segment in self.segments:
+            if segment['rows'] == 0:
+                continue
+            name = segment['name']
+            vectors = np.memmap(self._file(name + '.vec'), dtype='float32', mode='r',
+                                shape=(segment['rows'], self.dim))
+            with open(self._file(name + '.jsonl'), 'rb') as f:
+                metadata = [json.loads(line) for line in f.read(segment['meta_bytes']).splitlines()]
+            yield vectors, metadata
+
+    def iter_vectors(self):
+        """
+        Yields the memory-mapped float32 rows of each segment, without reading metadata.
+        """
+        for segment in self.segments:
+            if segment['rows']:
+                yield np.memmap(self._file(segment['name'] + '.vec'), dtype='float32', mode='r',
+                                shape=(segment['rows'], self.dim))
+
+    def row_offsets(self):
+        """
+        Returns (segments, offsets): per row, its segment number and the byte offset of its metadata line.
+        """
+        segments, offsets = [np.zeros(0, dtype='uint32')], [np.zeros(0, dtype='int64')]
+        for position, segment in enumerate(self.segments):
+            if not segment['rows']:
+                continue
+            # Line starts are found by scanning for newlines; no JSON is parsed
+            data = np.memmap(self._file(segment['name'] + '.jsonl'), dtype='uint8', mode='r',
+                             shape=(segment['meta_bytes'],))
+            ends = np.flatnonzero(data == ord('\n'))
+            offsets.append(np.concatenate(([0], ends[:-1] + 1)).astype('int64'))
+            segments.append(np.full(len(ends), position, dtype='uint32'))
+        return np.concatenate(segments), np.concatenate(offsets)
+
+    def read_metadata(self, segment, offset):
+        """
+        Reads the metadata line starting at byte offset of segment number `segment`.
+        """
+        with open(self._file(self.segments[segment]['name'] + '.jsonl'), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def _iter_pages(self):
+        """
+        Yields (page_key, url, vectors, metadata) for every appended page, in order.
+        """
+        for position, (vectors, metadata) in enumerate(self.iter_segments()):
+            start = 0
+            for row in range(1, len(metadata) + 1):
+                # A page is a run of consecutive rows sharing the same URL
+                if row == len(metadata) or metadata[row]['url'] != metadata[start]['url']:
+                    yield (position, start), metadata[start]['url'], vectors[start:row], metadata[start:row]
+                    start = row
+
+    def compact(self):
+        """
+        Rewrites the store into full segments, keeping only the latest ingestion of each URL.
+        """
+        self.close()
+
+        # Pass 1: find the latest copy of every page
+        latest = {}
+        for page_key, url, _, _ in self._iter_pages():
+            latest[url] = page_key
+
+        # Pass 2: stream surviving pages into a fresh store
+        compact_path = self.path + '.compact'
+        shutil.rmtree(compact_path, ignore_errors=True)
+        target = SegmentStore(compact_path, self.dim, self.segment_rows, self.checkpoint_every)
+        for page_key, url, vectors, metadata in self._iter_pages():
+            if latest[url] == page_key:
+                target.add_page(url, metadata, vectors)
+
+        # Pages that produced no chunks still count as done
+        empty = np.zeros((0, self.dim), dtype='float32')
+        for url in self.done_urls - latest.keys():
+            target.add_page(url, [], empty)
+        target.close()
+
+        # Swap directories; _finish_compaction completes this if we crash in between
+        old_segments = len(self.segments)
+        os.replace(self.path, self.path + '.old')
+        os.replace(compact_path, self.path)
+        shutil.rmtree(self.path + '.old')
+        self._load()
+        print(f"Compacted {old_segments} segments into {len(self.segments)} ({self.rows} rows)")
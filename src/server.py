@@ -0,0 +1,160 @@
+import argparse
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+from rag_model import RAGSystem
+from model_registry import registry, BACKENDS, EMBEDDER_NAME, GENERATOR_NAME
+from micro_batch import MicroBatcher, BatchingEmbedder
+from tracing import tracer
+
+
+class RAGService:
+    """
+    Keeps one warm RAGSystem and micro-batches embedding and generation across requests.
+
+    Each request runs retrieval on its own thread; all encode() calls go through a
+    shared embedding batcher and finished prompts through a generation batcher,
+    so concurrent requests share forward passes.
+    """
+    def __init__(self, rag, top_k=5, max_batch_size=8, max_wait=0.02, max_queue=64):
+        self.rag = rag
+        self.top_k = top_k
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.embedding = None
+        self.generation = None
+        self.ready = False
+        self.error = None
+        self.active_requests = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads and warms up the models; meant to run on a background thread.
+        """
+        try:
+            start = time.perf_counter()
+            self.rag.initialize_models()
+            embedder = BatchingEmbedder(self.rag.emb_model, max_batch_size=4 * self.max_batch_size)
+            self.rag.retriever.embedder = embedder
+            self.embedding = embedder.batcher
+            self.generation = MicroBatcher('generation', self._generate_many, self.max_batch_size, self.max_wait)
+
+            # One tiny pass through each model so the first request does not pay for lazy setup
+            embedder.encode(["warm up"])
+            self.rag.generator("warm up", max_new_tokens=1)
+            self.ready = True
+            print(f"Models ready in {time.perf_counter() - start:.1f}s")
+            registry.report()
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error loading models: {e}")
+
+    def _generate_many(self, prompts):
+        if len(prompts) == 1:
+            return [self.rag.generate(prompts[0])]
+        return self.rag.generate_batch(prompts)
+
+    def queue_depth(self):
+        return {
+            'active_requests': self.active_requests,
+            'embedding': self.embedding.stats() if self.embedding else None,
+            'generation': self.generation.stats() if self.generation else None
+        }
+
+    def answer(self, query, top_k=None):
+        with self._lock:
+            self.active_requests += 1
+        try:
+            return self.rag.generate_response_with_retriever(query, top_k or self.top_k, generate=self.generation.submit)
+        finally:
+            with self._lock:
+                self.active_requests -= 1
+
+
+def create_app(service):
+    app = Flask(__name__)
+
+    @app.get('/healthz')
+    def health():
+        # The process is up and serving, whether or not the models have loaded
+        return jsonify({'status': 'ok'})
+
+    @app.get('/readyz')
+    def ready():
+        if service.ready:
+            return jsonify({'status': 'ready'})
+        status = 'failed' if service.error else 'loading'
+        return jsonify({'status': status, 'error': service.error}), 503
+
+    @app.get('/queue')
+    def queue_depth():
+        return jsonify(service.queue_depth())
+
+    @app.get('/metrics')
+    def metrics():
+        return tracer.prometheus_text(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.post('/answer')
+    def answer():
+        if not service.ready:
+            return jsonify({'error': 'Models are not loaded yet'}), 503
+        if service.active_requests >= service.max_queue:
+            return jsonify({'error': 'Too many requests in flight'}), 503
+
+        body = request.get_json(silent=True) or {}
+        query = body.get('query')
+        if not isinstance(query, str) or not query.strip():
+            return jsonify({'error': 'Expected a JSON body with a non-empty "query" string'}), 400
+        top_k = body.get('top_k')
+        if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1):
+            return jsonify({'error': '"top_k" must be a positive integer'}), 400
+
+        start = time.perf_counter()
+        result = service.answer(query.strip(), top_k)
+        return jsonify({'query': query, 'answer': result, 'latency_ms': round((time.perf_counter() - start) * 1000, 1)})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the RAG system over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--embedder', default=EMBEDDER_NAME, help='Sentence embedding model name or path')
+    parser.add_argument('--generator', default=GENERATOR_NAME, help='Causal LM name or path')
+    parser.add_argument('--max-new-tokens', type=int, default=256)
+    parser.add_argument('--backend', default='auto', choices=BACKENDS,
+                        help='auto (float16, GPU if present), cpu (float32) or cpu-int8 (int8 quantized)')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads for the cpu backends')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--max-batch-size', type=int, default=8, help='Most prompts generated together')
+    parser.add_argument('--max-wait-ms', type=float, default=20, help='How long a batch waits to fill up')
+    parser.add_argument('--max-queue', type=int, default=64, help='Requests in flight before answering 503')
+    parser.add_argument('--corpus', default=None, help='Prebuilt corpus index to answer from first')
+    parser.add_argument('--search', default=None, help='Comma-separated searx endpoints, in order of preference')
+    parser.add_argument('--answer-cache', default=None, help='Directory of a persistent cache for repeated questions')
+    parser.add_argument('--trace', default=None, help='Append per-stage spans to this file as JSON lines')
+    parser.add_argument('--metrics', action='store_true', help='Record metrics for /metrics without a trace file')
+    args = parser.parse_args()
+
+    if args.trace or args.metrics:
+        tracer.enable(args.trace)
+
+    rag = RAGSystem(corpus_dir=args.corpus, embedder_name=args.embedder, generator_name=args.generator,
+                    max_new_tokens=args.max_new_tokens,
+                    search_endpoints=args.search.split(',') if args.search else None,
+                    answer_cache_dir=args.answer_cache, backend=args.backend, threads=args.threads)
+    service = RAGService(rag, top_k=args.top_k, max_batch_size=args.max_batch_size,
+                         max_wait=args.max_wait_ms / 1000, max_queue=args.max_queue)
+
+    # Serve health checks right away; readiness flips once the models are warm
+    threading.Thread(target=service.load, name='model-loader', daemon=True).start()
+    create_app(service).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket bounds in seconds, from single parse calls up to full 7B generations
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NoopSpan:
+    """
+    Returned by Tracer.span while tracing is off, so instrumented code costs one call.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent = None
+        self.trace = self.id
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent = stack[-1].id
+            self.trace = stack[-1].trace
+        stack.append(self)
+        self.start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        self.tracer._stack().pop()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer._finish(self, duration)
+        return False
+
+
+class Tracer:
+    """
+    Per-stage spans and metrics for the retrieval and generation path.
+
+    Disabled by default. Once enabled, every finished span is appended as one
+    JSON line to the trace file (if any) and aggregated into per-stage latency
+    histograms and counters that can be exported in the Prometheus text format.
+    Spans nest per thread; work handed to a thread pool keeps its parent through
+    Tracer.wrap.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+        self._histograms = {}
+        self._counters = {}
+        self._server = None
+
+    def enable(self, trace_path=None):
+        self.enabled = True
+        if trace_path:
+            self._file = open(trace_path, 'a', encoding='utf-8', buffering=1)
+
+    def disable(self):
+        self.enabled = False
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def wrap(self, fn):
+        """
+        Binds fn to the current span, so spans opened on a pool thread nest under it.
+        """
+        if not self.enabled or not self._stack():
+            return fn
+        parent = self._stack()[-1]
+
+        def run(*args, **kwargs):
+            stack = self._stack()
+            stack.append(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stack.pop()
+        return run
+
+    def record(self, name, start, duration, **attrs):
+        """
+        Records an already measured interval (perf_counter start) as a child of the current span.
+        """
+        if not self.enabled:
+            return
+        span = Span(self, name, attrs)
+        stack = self._stack()
+        if stack:
+            span.parent = stack[-1].id
+            span.trace = stack[-1].trace
+        span.start = time.time() - (time.perf_counter() - start)
+        self._finish(span, duration)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _finish(self, span, duration):
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += duration
+            histogram['count'] += 1
+
+            if self._file:
+                record = {'trace': span.trace, 'span': span.id, 'parent': span.parent, 'name': span.name,
+                          'start': round(span.start, 6), 'duration_ms': round(duration * 1000, 3)}
+                record.update(span.attrs)
+                self._file.write(json.dumps(record, default=str) + '\n')
+
+    def prometheus_text(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = ['# HELP rag_stage_seconds Duration of retrieval and generation stages',
+                 '# TYPE rag_stage_seconds histogram']
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    lines.append(f'rag_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'rag_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'rag_stage_seconds_sum{{stage="{name}"}} {histogram["sum"]:.6f}')
+                lines.append(f'rag_stage_seconds_count{{stage="{name}"}} {histogram["count"]}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'# TYPE rag_{name} counter')
+                lines.append(f'rag_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def serve_metrics(self, port, host='0.0.0.0'):
+        """
+        Serves prometheus_text() at /metrics from a background thread.
+        """
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+class GenerationTimer:
+    """
+    Generation streamer that splits model.generate time into prefill and decode.
+
+    generate() hands the prompt ids to put() once, then every decoding step's
+    new tokens; the first step after the prompt marks the end of prefill.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end_time = None
+        self.prompt_tokens = 0
+        self.steps = 0
+        self.batch = 1
+        self._seen_prompt = False
+
+    def put(self, value):
+        if not self._seen_prompt:
+            self._seen_prompt = True
+            self.batch = value.shape[0] if value.dim() > 1 else 1
+            self.prompt_tokens = value.shape[-1] * self.batch
+            return
+        self.steps += 1
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def end(self):
+        self.end_time = time.perf_counter()
+
+    def report(self, tracer):
+        """
+        Records prefill and decode as child spans and returns summary attributes.
+        """
+        end = self.end_time or time.perf_counter()
+        first = self.first_token or end
+        prefill, decode = first - self.start, end - first
+        new_tokens = self.steps * self.batch
+        tracer.record('generate.prefill', self.start, prefill, prompt_tokens=self.prompt_tokens)
+        tracer.record('generate.decode', first, decode, new_tokens=new_tokens)
+        tracer.count('prompt_tokens_total', self.prompt_tokens)
+        tracer.count('generated_tokens_total', new_tokens)
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'new_tokens': new_tokens,
+            'prefill_ms': round(prefill * 1000, 3),
+            'decode_ms': round(decode * 1000, 3),
+            'tokens_per_second': round(new_tokens / decode, 2) if decode > 0 else None
+        }
+
+
+# Shared by every instrumented module; enabled from the command line
+tracer = Tracer()
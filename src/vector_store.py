@@ -0,0 +1,147 @@
+import json
+import os
+
+import faiss
+import numpy as np
+
+CODES = ('pq', 'int8')
+METRICS = {'ip': faiss.METRIC_INNER_PRODUCT, 'l2': faiss.METRIC_L2}
+
+
+class CompressedVectorStore:
+    """
+    Compact vector index searched in two stages.
+
+    Only compressed codes stay in memory: product-quantized ('pq', one byte per
+    subvector, 8 dimensions by default, so 32x smaller than float32) or scalar
+    int8 ('int8', 4x smaller). A search first shortlists `k * rerank`
+    candidates by their codes, then rescores just those rows exactly from a
+    memory-mapped float16 copy of the vectors (`vectors.f16`) and keeps the
+    best k. Results follow faiss' `search` convention, so the store can stand
+    in for a faiss index.
+
+    Build with `train(sample)`, `add(vectors)` (any number of times) and
+    `close()`; open a finished store with `load(path)`.
+    """
+    CODES_FILE = 'codes.index'
+    VECTORS_FILE = 'vectors.f16'
+    META_FILE = 'meta.json'
+
+    def __init__(self, path, dim, codes='pq', metric='ip', pq_m=None, rerank=10):
+        if codes not in CODES:
+            raise ValueError(f"Unknown code type {codes!r}, expected one of {', '.join(CODES)}")
+        self.path = path
+        self.d = dim
+        self.codes = codes
+        self.metric = metric
+        self.pq_m = pq_m or self._default_pq_m(dim)
+        self.rerank = rerank
+        self.index = None
+        self.vectors = None
+        self._vectors_file = None
+
+    @staticmethod
+    def _default_pq_m(dim):
+        # Subvectors of 8 dimensions where possible; PQ needs dim to be a multiple of m
+        return next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @classmethod
+    def load(cls, path, rerank=10):
+        with open(os.path.join(path, cls.META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        store = cls(path, meta['dim'], meta['codes'], meta['metric'], meta['pq_m'], rerank)
+        store.index = faiss.read_index(store._file(cls.CODES_FILE))
+        store._map_vectors()
+        return store
+
+    def _map_vectors(self):
+        # Rows are only paged in when a search rescores them
+        self.vectors = (np.memmap(self._file(self.VECTORS_FILE), dtype='float16', mode='r', shape=(self.ntotal, self.d))
+                        if self.ntotal else np.zeros((0, self.d), dtype='float16'))
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def train(self, sample):
+        """
+        Creates the code index and fits it (PQ codebooks or int8 ranges) to a sample of the vectors.
+        """
+        sample = np.ascontiguousarray(sample, dtype='float32').reshape(-1, self.d)
+        if self.codes == 'pq':
+            # k-means needs at least as many points as centroids, so tiny corpora get fewer bits per code
+            nbits = max(1, min(8, int(np.log2(max(2, len(sample))))))
+            self.index = faiss.IndexPQ(self.d, self.pq_m, nbits, METRICS[self.metric])
+        else:
+            self.index = faiss.IndexScalarQuantizer(self.d, faiss.ScalarQuantizer.QT_8bit, METRICS[self.metric])
+        self.index.train(sample)
+
+        # A rebuild starts from an empty vector file
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_file = open(self._file(self.VECTORS_FILE), 'wb')
+
+    def add(self, vectors):
+        """
+        Encodes vectors into the in-memory codes and appends their float16 copy to disk.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype='float32').reshape(-1, self.d)
+        self.index.add(vectors)
+        self._vectors_file.write(vectors.astype('float16').tobytes())
+
+    def close(self):
+        """
+        Writes the code index and metadata and maps the vector file for searching.
+        """
+        self._vectors_file.close()
+        self._vectors_file = None
+        faiss.write_index(self.index, self._file(self.CODES_FILE))
+        meta = {'dim': self.d, 'codes': self.codes, 'metric': self.metric, 'pq_m': self.pq_m, 'rows': self.ntotal}
+        with open(self._file(self.META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        self._map_vectors()
+
+    def search(self, queries, k):
+        """
+        Returns (scores, ids) arrays of shape (len(queries), k), best first; missing hits have id -1.
+
+        Scores are inner products for metric 'ip' and squared L2 distances for 'l2'.
+        """
+        queries = np.ascontiguousarray(queries, dtype='float32').reshape(-1, self.d)
+        shortlist = min(self.ntotal, k * max(1, self.rerank))
+        ids = np.full((len(queries), k), -1, dtype='int64')
+        fill = -np.inf if self.metric == 'ip' else np.inf
+        scores = np.full((len(queries), k), fill, dtype='float32')
+        if shortlist == 0:
+            return scores, ids
+
+        # Step 1: Shortlist candidates by their codes
+        _, candidates = self.index.search(queries, shortlist)
+
+        # Step 2: Rescore the shortlist from the float16 vectors, read in file order
+        for row, (query, row_candidates) in enumerate(zip(queries, candidates)):
+            row_candidates = np.sort(row_candidates[row_candidates >= 0])
+            vectors = self.vectors[row_candidates].astype('float32')
+            if self.metric == 'ip':
+                exact = vectors @ query
+                best = np.argsort(-exact, kind='stable')[:k]
+            else:
+                exact = ((vectors - query) ** 2).sum(axis=1)
+                best = np.argsort(exact, kind='stable')[:k]
+            ids[row, :len(best)] = row_candidates[best]
+            scores[row, :len(best)] = exact[best]
+        return scores, ids
+
+    def memory_bytes(self):
+        """
+        Bytes held in memory: the codes plus codebooks or quantizer ranges.
+        """
+        return len(faiss.serialize_index(self.index)) if self.index is not None else 0
+
+    def disk_bytes(self):
+        """
+        Bytes of the memory-mapped float16 vectors (paged in on demand).
+        """
+        return self.ntotal * self.d * 2
@@ -1,9 +1,24 @@
 import requests
 import re
-from bs4 import BeautifulSoup
+import threading
+import time
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from html_extract import extract_page
+from tracing import tracer
 
 class WikiScraper:
-    def __init__(self):
+    def __init__(self, cache=None, timeout=10, retries=3, backoff=0.5, pool_size=10, max_per_host=4):
+        # Optional PageCache; without one every call hits the network
+        self.cache = cache
+        self.timeout = timeout
+
+        # Cap parallel requests per host so concurrent fetches stay polite
+        self.max_per_host = max_per_host
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -11,13 +26,96 @@ class WikiScraper:
                           'Chrome/90.0.4430.212 Safari/537.36'
         })
 
+        # Keep-alive pool sized for concurrent fetches, retrying transient failures with backoff
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET'])
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_limits[host]
+
     def scrape_page(self, url):
-        # Fetch the page
-        resp = self.session.get(url)
-        resp.raise_for_status()
+        page = self.fetch_page(url)
+        if isinstance(page, tuple):
+            return page
+        return self.process_response(url, page)
+
+    def fetch_page(self, url):
+        """
+        Network half of scrape_page: returns (title, text) when the cache can answer,
+        otherwise the HTTP response that still needs to be parsed.
+        """
+        with tracer.span('fetch', url=url) as span:
+            start = time.perf_counter()
+
+            # Serve fresh cache entries without touching the network or the parser
+            entry = self.cache.get(url) if self.cache else None
+            if entry and self.cache.is_fresh(entry):
+                self.cache.record_hit(time.perf_counter() - start)
+                span.set(cache='hit')
+                return entry['title'], entry['text']
+
+            # Fetch the page, revalidating a stale cache entry when possible
+            headers = {}
+            if entry:
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    headers['If-Modified-Since'] = entry['last_modified']
+            with self._host_limit(url):
+                resp = self.session.get(url, headers=headers, timeout=self.timeout)
+
+            if entry and resp.status_code == 304:
+                self.cache.refresh(url, entry)
+                self.cache.record_hit(time.perf_counter() - start, revalidated=True)
+                span.set(cache='revalidated')
+                return entry['title'], entry['text']
+            resp.raise_for_status()
+            span.set(cache='miss', status=resp.status_code, bytes=len(resp.content))
+            return resp
+
+    def process_response(self, url, resp):
+        """
+        CPU half of scrape_page: parses a fetched response and stores it in the cache.
+        """
+        start = time.perf_counter()
+        with tracer.span('parse', url=url, bytes=len(resp.content)):
+            title, full_text = self.parse_html(resp.content)
+
+        if self.cache:
+            self.cache.put(url, resp.content, title, full_text,
+                           etag=resp.headers.get('ETag'),
+                           last_modified=resp.headers.get('Last-Modified'))
+            self.cache.record_miss(resp.elapsed.total_seconds() + time.perf_counter() - start)
+
+        return title, full_text
+
+    def parse_html(self, html):
+        """
+        Extracts the page title and cleaned paragraph text from raw Wikipedia HTML.
+        """
+        # Single streaming pass over the content div, no parse tree
+        return extract_page(html)
+
+    def parse_html_soup(self, html):
+        """
+        Reference BeautifulSoup implementation of parse_html, kept for fixture checks and benchmarks.
+        """
+        # Only this reference path needs bs4, so it is imported here rather than on every startup
+        from bs4 import BeautifulSoup
 
         # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(resp.content, 'html.parser')
+        soup = BeautifulSoup(html, 'html.parser')
 
         # Locate the main content div
         content_div = soup.find('div', class_='mw-content-ltr mw-parser-output')
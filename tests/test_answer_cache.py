@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+import numpy as np
+
+from answer_cache import AnswerCache
+
+
+class HashEmbedder:
+    """
+    Deterministic stand-in for a sentence embedder: unrelated texts get near-orthogonal vectors.
+    """
+    def encode(self, texts, **kwargs):
+        seeds = [int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:4], 'little') for text in texts]
+        return np.array([np.random.default_rng(seed).standard_normal(64) for seed in seeds], dtype='float32')
+
+
+OLD_PAGE = [('Doom', 'Doom was released in 1993.', 0.1)]
+NEW_PAGE = [('Doom', 'Doom was released on December 10, 1993.', 0.1)]
+
+
+def make_cache(path, ttl=3600):
+    return AnswerCache(HashEmbedder(), 'embedder', 'generator', cache_dir=str(path), ttl=ttl)
+
+
+def test_repeat_is_answered_before_retrieval_even_if_pages_changed(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('When was Doom released?', OLD_PAGE, '1993')
+
+    # A repeat never looks at the pages: within the TTL it gets the stored answer
+    assert cache.lookup('when was doom released') == '1993'
+    assert cache.stats()['exact_hits'] == 1
+
+    # After retrieval, only the same chunk set reuses the answer
+    assert cache.get('When was Doom released?', OLD_PAGE) == '1993'
+    assert cache.get('When was Doom released?', NEW_PAGE) is None
+
+
+def test_repeat_expires_after_ttl(tmp_path):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.put('When was Doom released?', OLD_PAGE, '1993')
+    for entry in cache._entries.values():
+        entry['created'] = time.time() - 61
+    assert cache.lookup('When was Doom released?') is None
+
+
+def test_answers_survive_reload(tmp_path):
+    make_cache(tmp_path).put('When was Doom released?', OLD_PAGE, '1993')
+    assert make_cache(tmp_path).lookup('When was Doom released?') == '1993'
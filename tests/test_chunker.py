@@ -0,0 +1,68 @@
+import glob
+import os
+import random
+
+import pytest
+
+from chunker import DEFAULT_SEPARATORS, TextChunker
+from retriever import Retriever
+from wiki_scraper import WikiScraper
+
+langchain = pytest.importorskip('langchain_text_splitters')
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures', 'wiki')
+SETTINGS = [(1024, 200), (500, 200), (200, 50), (64, 0), (10, 9)]
+
+
+def fixture_texts():
+    scraper = WikiScraper()
+    texts = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'rb') as f:
+            texts.append(scraper.parse_html(f.read())[1])
+    return texts
+
+
+def random_texts(count=200, seed=0):
+    rng = random.Random(seed)
+    pieces = ['word', 'a', 'longerword', 'x' * 40, ' ', '  ', '\n', '\n\n', '.', '!', '?', ',', '. ', ', ', '\t']
+    return [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 300))) for _ in range(count)]
+
+
+def langchain_chunks(text, chunk_size, chunk_overlap):
+    splitter = langchain.RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                        separators=DEFAULT_SEPARATORS)
+    return [document.page_content for document in splitter.create_documents([text])]
+
+
+@pytest.mark.parametrize('chunk_size,chunk_overlap', SETTINGS)
+def test_matches_langchain_on_fixture_pages(chunk_size, chunk_overlap):
+    chunker = TextChunker(chunk_size, chunk_overlap)
+    for text in fixture_texts():
+        assert chunker.split(text) == langchain_chunks(text, chunk_size, chunk_overlap)
+
+
+@pytest.mark.parametrize('chunk_size,chunk_overlap', SETTINGS)
+def test_matches_langchain_on_random_text(chunk_size, chunk_overlap):
+    chunker = TextChunker(chunk_size, chunk_overlap)
+    for text in random_texts():
+        assert chunker.split(text) == langchain_chunks(text, chunk_size, chunk_overlap)
+
+
+def test_offsets_point_into_the_text():
+    text = fixture_texts()[0]
+    for start, end in TextChunker(500, 200).split_offsets(text):
+        assert 0 <= start < end <= len(text)
+
+
+def test_retriever_chunks_match_the_langchain_pipeline():
+    # The embedder is never used for character-sized chunks
+    retriever = Retriever(embedder=object())
+    for text in fixture_texts() + random_texts(50):
+        expected = [chunk.lstrip(" .,!?\n") for chunk in langchain_chunks(text, 1024, 200)]
+        assert retriever.split_text_into_chunks(text, 1024, 200) == expected
+
+
+def test_rejects_overlap_larger_than_chunk():
+    with pytest.raises(ValueError):
+        TextChunker(100, 200)
@@ -0,0 +1,93 @@
+import hashlib
+import multiprocessing
+import os
+import random
+import threading
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+DIM = 16
+TEXTS = [f"chunk {i}" for i in range(300)]
+
+
+def expected(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:4], 'little')
+    return np.random.default_rng(seed).standard_normal(DIM).astype('float32')
+
+
+def encode(texts):
+    return np.stack([expected(text) for text in texts])
+
+
+def open_cache(cache_dir):
+    return EmbeddingCache('model', DIM, 1024, 200, cache_dir=cache_dir)
+
+
+def append_worker(cache_dir, seed, errors):
+    # Every process opens the cache before the others have written, then appends overlapping batches
+    cache = open_cache(cache_dir)
+    rng = random.Random(seed)
+    for _ in range(20):
+        texts = rng.sample(TEXTS, 40)
+        if not np.array_equal(np.asarray(cache.get(texts, encode)), encode(texts)):
+            errors.put(seed)
+
+
+def test_processes_sharing_a_cache_never_overwrite_each_other(tmp_path):
+    cache_dir = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    errors = context.Queue()
+    processes = [context.Process(target=append_worker, args=(cache_dir, seed, errors)) for seed in range(6)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    assert errors.empty()
+
+    # A fresh reader sees every vector at the row its index line points to, each stored once
+    cache = open_cache(cache_dir)
+    stored = [text for text in TEXTS if cache.key(text) in cache.offsets]
+    assert np.array_equal(np.asarray(cache.get(stored, encode)), encode(stored))
+    assert len(set(cache.offsets.values())) == len(cache.offsets) == cache._file_rows()
+
+
+def test_threads_sharing_a_cache(tmp_path):
+    cache = open_cache(str(tmp_path))
+    failures = []
+
+    def work(seed):
+        rng = random.Random(seed)
+        for _ in range(20):
+            texts = rng.sample(TEXTS, 40)
+            if not np.array_equal(np.asarray(cache.get(texts, encode)), encode(texts)):
+                failures.append(seed)
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not failures
+    assert len(cache.offsets) == cache._file_rows()
+
+
+def test_interrupted_append_is_ignored_on_open(tmp_path):
+    cache = open_cache(str(tmp_path))
+    cache.get(TEXTS[:3], encode)
+
+    # A writer died after writing half a row and half an index line
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(b'\x00' * 10)
+    with open(cache.index_path, 'ab') as f:
+        f.write(f"{cache.key(TEXTS[3])}\t3\n{cache.key(TEXTS[4])}\t".encode('utf-8'))
+
+    reopened = open_cache(str(tmp_path))
+    assert set(reopened.offsets) == {cache.key(text) for text in TEXTS[:3]}
+    calls = []
+    vectors = reopened.get(TEXTS[:6], lambda texts: calls.append(list(texts)) or encode(texts))
+    assert calls == [TEXTS[3:6]]
+    assert np.array_equal(np.asarray(vectors), encode(TEXTS[:6]))
+    assert os.path.getsize(reopened.vectors_path) == 6 * 4 * DIM
@@ -0,0 +1,98 @@
+import glob
+import os
+import random
+
+import pytest
+
+from html_extract import clean_paragraph
+from wiki_scraper import WikiScraper
+
+pytest.importorskip('bs4')
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures', 'wiki')
+
+WORDS = ['Doom', 'game', "player's", 'the', 'Ubisoft', '1993', 'RPG', '&amp;', '&nbsp;', '&#39;', 'café', '日本']
+PUNCTUATION = ['(', ')', '.', ',', ';', ':', '!', '?', "'", '[1]', '[23]', '[a]', '  ', '\n', '\t', ' ']
+
+
+def random_text(rng):
+    return ''.join(rng.choice(WORDS + PUNCTUATION) + rng.choice(['', ' ']) for _ in range(rng.randint(0, 8)))
+
+
+def random_inline(rng, depth):
+    """
+    Random paragraph content: text, links, emphasis, citation sups and hidden elements.
+    """
+    parts = []
+    for _ in range(rng.randint(1, 5)):
+        kind = rng.randrange(9) if depth < 3 else 0
+        if kind <= 2:
+            parts.append(random_text(rng))
+        elif kind == 3:
+            parts.append(f'<a href="/wiki/X">{random_inline(rng, depth + 1)}</a>')
+        elif kind == 4:
+            tag = rng.choice(['b', 'i', 'span', 'small'])
+            parts.append(f'<{tag}>{random_inline(rng, depth + 1)}</{tag}>')
+        elif kind == 5:
+            parts.append(f'<sup class="reference"><a href="#cite">[{rng.randint(1, 99)}]</a></sup>')
+        elif kind == 6:
+            parts.append(f'<sup>{random_text(rng)}</sup>')
+        elif kind == 7:
+            tag = rng.choice(['script', 'style'])
+            parts.append(f'<{tag}>{random_text(rng)}</{tag}>')
+        else:
+            parts.append(rng.choice(['<br>', '<br/>', '<img src="x.png" alt="y">', '<wbr>']))
+    return ''.join(parts)
+
+
+def random_block(rng, depth=0):
+    """
+    Random content-div child: plain or classed paragraphs, nested divs, tables and lists.
+    """
+    kind = rng.randrange(7) if depth < 2 else 0
+    if kind <= 2:
+        return f'<p>{random_inline(rng, 0)}</p>'
+    if kind == 3:
+        attribute = rng.choice(['class="mw-empty-elt"', 'id="intro"', 'class="hatnote"'])
+        return f'<p {attribute}>{random_inline(rng, 0)}</p>'
+    if kind == 4:
+        return f'<div class="thumb">{"".join(random_block(rng, depth + 1) for _ in range(rng.randint(1, 3)))}</div>'
+    if kind == 5:
+        return f'<table class="infobox"><tr><td>{random_block(rng, depth + 1)}</td></tr></table>'
+    return f'<ul><li>{random_inline(rng, 0)}</li></ul>'
+
+
+def random_page(rng):
+    blocks = ''.join(random_block(rng) for _ in range(rng.randint(0, 6)))
+    return (f'<html><head><title>T</title></head><body><main>'
+            f'<h1 id="firstHeading" class="firstHeading"><span>{random_text(rng)}</span></h1>'
+            f'<div id="mw-content-text"><div class="mw-content-ltr mw-parser-output" lang="en">{blocks}</div></div>'
+            f'<p>Outside the content</p></main></body></html>').encode('utf-8')
+
+
+def test_fixture_pages_match_beautifulsoup():
+    scraper = WikiScraper()
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))
+    assert paths
+    for path in paths:
+        with open(path, 'rb') as f:
+            html = f.read()
+        assert scraper.parse_html(html) == scraper.parse_html_soup(html), path
+
+
+def test_random_pages_match_beautifulsoup():
+    scraper = WikiScraper()
+    rng = random.Random(0)
+    for _ in range(1000):
+        html = random_page(rng)
+        assert scraper.parse_html(html) == scraper.parse_html_soup(html), html
+
+
+def test_page_without_content_div():
+    scraper = WikiScraper()
+    html = b'<html><body><h1 id="firstHeading">Title</h1><p>Not article text</p></body></html>'
+    assert scraper.parse_html(html) == scraper.parse_html_soup(html)
+
+
+def test_clean_paragraph():
+    assert clean_paragraph("Doom ( 1993 ) is a game[1] , by id ' s team  .") == "Doom (1993) is a game, by id's team."
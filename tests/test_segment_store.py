@@ -0,0 +1,139 @@
+import os
+import shutil
+
+import numpy as np
+
+from segment_store import SegmentStore
+
+DIM = 4
+
+
+def page(url, rows, value):
+    entries = [{'url': url, 'title': url, 'text': f"{url} chunk {i}"} for i in range(rows)]
+    return url, entries, np.full((rows, DIM), value, dtype='float32')
+
+
+def contents(store):
+    vectors, metadata = [], []
+    for segment_vectors, segment_metadata in store.iter_segments():
+        vectors.append(np.array(segment_vectors))
+        metadata.extend(segment_metadata)
+    return (np.concatenate(vectors) if vectors else np.zeros((0, DIM), dtype='float32')), metadata
+
+
+def test_reopen_truncates_to_last_checkpoint(tmp_path):
+    path = str(tmp_path / 'store')
+    store = SegmentStore(path, DIM, segment_rows=3, checkpoint_every=1000)
+    store.add_page(*page('a', 2, 1.0))
+    store.add_page(*page('b', 2, 2.0))
+    store.checkpoint()
+
+    # Written but never checkpointed, as if the process was killed here
+    store.add_page(*page('c', 2, 3.0))
+    for handle in store._handles:
+        handle.flush()
+    with open(os.path.join(path, 'stray.tmp'), 'w') as f:
+        f.write('left over')
+
+    reopened = SegmentStore(path, DIM, segment_rows=3)
+    assert reopened.done_urls == {'a', 'b'}
+    assert reopened.rows == 4
+    vectors, metadata = contents(reopened)
+    assert [entry['url'] for entry in metadata] == ['a', 'a', 'b', 'b']
+    assert vectors[:, 0].tolist() == [1.0, 1.0, 2.0, 2.0]
+    assert not os.path.exists(os.path.join(path, 'stray.tmp'))
+
+    # Ingestion resumes with the lost page, and appends line up with the truncated files
+    reopened.add_page(*page('c', 2, 3.0))
+    reopened.close()
+    vectors, metadata = contents(SegmentStore(path, DIM, segment_rows=3))
+    assert [entry['url'] for entry in metadata] == ['a', 'a', 'b', 'b', 'c', 'c']
+    assert vectors[:, 0].tolist() == [1.0, 1.0, 2.0, 2.0, 3.0, 3.0]
+
+
+def test_partial_write_after_checkpoint_is_discarded(tmp_path):
+    path = str(tmp_path / 'store')
+    store = SegmentStore(path, DIM)
+    store.add_page(*page('a', 1, 1.0))
+    store.close()
+
+    # A torn write: half a vector, half a metadata line and a URL without newline
+    name = store.segments[-1]['name']
+    for suffix, data in (('.vec', b'\x00' * 6), ('.jsonl', b'{"url": "b"')):
+        with open(os.path.join(path, name + suffix), 'ab') as f:
+            f.write(data)
+    with open(os.path.join(path, SegmentStore.URLS_FILE), 'ab') as f:
+        f.write(b'b')
+
+    reopened = SegmentStore(path, DIM)
+    assert reopened.done_urls == {'a'}
+    vectors, metadata = contents(reopened)
+    assert len(vectors) == len(metadata) == 1
+
+
+def test_compaction_keeps_latest_copy_of_each_page(tmp_path):
+    path = str(tmp_path / 'store')
+    store = SegmentStore(path, DIM, segment_rows=2)
+    store.add_page(*page('a', 2, 1.0))
+    store.add_page(*page('b', 1, 2.0))
+    store.add_page(*page('a', 3, 5.0))
+    store.add_page('empty', [], np.zeros((0, DIM), dtype='float32'))
+    store.close()
+
+    store.compact()
+    assert not os.path.exists(path + '.compact') and not os.path.exists(path + '.old')
+    reopened = SegmentStore(path, DIM, segment_rows=2)
+    assert reopened.done_urls == {'a', 'b', 'empty'}
+    vectors, metadata = contents(reopened)
+    assert sorted((entry['url'], float(v[0])) for entry, v in zip(metadata, vectors)) == \
+        [('a', 5.0)] * 3 + [('b', 2.0)]
+    assert reopened.rows == 4
+
+
+def test_interrupted_compaction_swap_is_finished_on_open(tmp_path):
+    path = str(tmp_path / 'store')
+    store = SegmentStore(path, DIM)
+    store.add_page(*page('a', 1, 1.0))
+    store.add_page(*page('a', 1, 2.0))
+    store.close()
+
+    # Crash after the old store was moved aside but before the compacted one took its place
+    compacted = SegmentStore(path + '.compact', DIM)
+    compacted.add_page(*page('a', 1, 2.0))
+    compacted.close()
+    os.replace(path, path + '.old')
+
+    reopened = SegmentStore(path, DIM)
+    assert not os.path.exists(path + '.compact') and not os.path.exists(path + '.old')
+    vectors, metadata = contents(reopened)
+    assert vectors[:, 0].tolist() == [2.0] and len(metadata) == 1
+
+
+def test_unfinished_compaction_is_discarded_on_open(tmp_path):
+    path = str(tmp_path / 'store')
+    store = SegmentStore(path, DIM)
+    store.add_page(*page('a', 1, 1.0))
+    store.close()
+
+    # Crash while the compacted copy was still being written: the original store is intact
+    shutil.copytree(path, path + '.compact')
+    with open(os.path.join(path + '.compact', 'garbage'), 'w') as f:
+        f.write('x')
+
+    reopened = SegmentStore(path, DIM)
+    assert not os.path.exists(path + '.compact')
+    assert reopened.done_urls == {'a'}
+
+
+def test_row_offsets_locate_metadata_lines(tmp_path):
+    store = SegmentStore(str(tmp_path / 'store'), DIM, segment_rows=2)
+    expected = []
+    for i in range(5):
+        url, entries, vectors = page(f"page {i} é\n", i % 3, float(i))
+        store.add_page(url, entries, vectors)
+        expected.extend(entries)
+    store.close()
+
+    segments, offsets = store.row_offsets()
+    assert len(segments) == len(offsets) == store.rows
+    assert [store.read_metadata(int(s), int(o)) for s, o in zip(segments, offsets)] == expected